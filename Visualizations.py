@@ -3,46 +3,61 @@
 # Due Date: Monday, October 7 2024
 
 # Import necessary libraries
-import pandas as pd
-import matplotlib.pyplot as plt
-import numpy as np
+# pandas, matplotlib and the dataset code are imported by the functions that use them,
+# so importing this file (e.g. for get_top5_drivers) is fast and draws nothing
+import os
+
+import figures
+import memo
+
+# Dataset file written by datamining.py, either the csv or a typed .parquet file
+DATA_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "f1_2023Weather.csv")
+
+# Columns the visualizations use, nothing else is read from the file
+DATA_COLUMNS = ['Race Name', 'Race Date', 'Driver Name', 'Position', 'Race Point', 'Rainfall', 'Air Temperature',
+                'Relative Humidity', 'Air Pressure', 'Track Temperature', 'Wind Speed']
+
+# Weather conditions plotted against the race positions, in the order saveWeatherConditions returns them
+CONDITION_NAMES = ["Air Temperature", "Relative Humidity", "Air Pressure", "Track Temperature", "Wind Speed"]
 
 # Functions for visualizations 1 and 2:
 
 def get_top5_drivers(df):
   "Given the dataframe, calculates and returns a series of the top 5 F1 drivers from 2018-2024."
 
-  # Group the data by driver name and take sum from individual's total point
-  total_points = df.groupby('Driver Name')['Race Point'].sum().reset_index()
+  # Total points of every driver from the standings engine, the top 5 are picked without sorting every driver
+  import standings
 
-  # Sort drivers by total points (top 5)
-  top5_drivers = total_points.sort_values(by='Race Point', ascending=False).head(5).reset_index(drop=True) 
+  return standings.top_drivers(df, 5)
 
-  return top5_drivers['Driver Name'] 
+def normalizeWeather(weatherDf, normalizer=None):
+  "Returns a copy of the dataframe with the numerical weather attributes min-max normalized."
 
-def normalizeWeather(weatherDf):
-  "Normalizes each entry for the numerical weather attributes."
+  from normalizer import WeatherNormalizer
 
-  columns = ['Air Temperature', 'Relative Humidity', 'Air Pressure', 'Track Temperature', 'Wind Speed']
-  for column in columns:
-    weatherDf[column] = (weatherDf[column] - weatherDf[column].min()) / (weatherDf[column].max() - weatherDf[column].min())
-  return weatherDf
+  # Fit the min/max of all weather columns in one pass, unless already fitted parameters are given
+  # (e.g. WeatherNormalizer.load("normalizer.json")). The caller's dataframe is not changed.
+  # normalizer.py writes the normalized dataset file (normalizedData.csv).
+  if normalizer is None:
+    normalizer = WeatherNormalizer().fit(weatherDf)
+  return normalizer.transform(weatherDf)
 
 
-def get_race_positions(driver_name, df):
+def get_race_positions(driver_name, data):
   "Given the driver names, returns their race positions from 2018-2024."
 
-  driver_data = df[df['Driver Name'] == driver_name]
+  # served from the driver index of the RaceDataset, no scan over the frame
+  driver_data = data.driver(driver_name)
   return driver_data['Position'], driver_data['Race Name']
 
 
-def get_weatherConditions(raceNames, df):
-  "Given a series of race names, returns the normalized numerical weather conditions for the race."
+def get_weatherConditions(raceNames, data):
+  "Given a race name and the RaceDataset, returns the normalized numerical weather conditions for the race."
 
-  race_data = df[df['Race Name'] == raceNames]
   # For each race, the weather is the average temperature for the entirety of the race. 
-  # Since rows for each driver in the race contain the same weather conditions, only take the first value.
-  return race_data['Air Temperature'].iloc[0], race_data['Relative Humidity'].iloc[0], race_data['Air Pressure'].iloc[0], race_data['Track Temperature'].iloc[0], race_data['Wind Speed'].iloc[0]
+  # The races table stores it once per race, so this is a single index lookup instead of a scan over every driver row.
+  race_data = data.weather(raceNames)
+  return race_data['Air Temperature'], race_data['Relative Humidity'], race_data['Air Pressure'], race_data['Track Temperature'], race_data['Wind Speed']
 
 def saveWeatherConditions(top5_drivers, weatherData):
   positions = []
@@ -67,6 +82,8 @@ def saveWeatherConditions(top5_drivers, weatherData):
     return airTemp, humidity, airPress, trackTemp, windSpeed
 
 def plotWeatherCondition(top5_drivers, condition, conditionName, weatherData):
+    import matplotlib.pyplot as plt
+
     positions = []
     race_names = []
     plt.figure(figsize=(25,10))
@@ -75,7 +92,7 @@ def plotWeatherCondition(top5_drivers, condition, conditionName, weatherData):
     for driver in top5_drivers:
       positions, race_names = get_race_positions(driver, weatherData)
       plt.plot(race_names, positions, linestyle = ":")
-    plt.plot(race_names, condition, color = "black", label = condition)
+    plt.plot(race_names, condition, color = "black", label = conditionName)
 
     # Add the selected weather condition.
     plt.title(conditionName + " vs. Race Positions for Top 5 Racers")
@@ -85,18 +102,37 @@ def plotWeatherCondition(top5_drivers, condition, conditionName, weatherData):
     plt.legend(top5_drivers, bbox_to_anchor=(1,1))
     plt.gca().invert_yaxis()
     plt.xticks(rotation='vertical') # 글자 수직정렬
-    plt.show()
+    figures.finish("weather_" + conditionName.lower())
     
     
 
-def visualization12():
-    # Load the CSV data file
-    f1_data = pd.read_csv("f1_2023Weather.csv") # i will update the csv file (the one with 2018-2024)
-    f1_data = normalizeWeather(f1_data)
+@memo.memoize
+def weather_plot_data(path=DATA_FILE):
+    "Returns the data visualization12 plots: the dataset with normalized weather, the same with normalized positions, the top 5 drivers and their weather conditions. Cached on disk until the dataset changes (see memo.py)."
+
+    import dataset
 
+    # Load the shared dataset, it is only read from disk once for all visualizations
+    data = dataset.open_dataset(path, columns=DATA_COLUMNS) # i will update the csv file (the one with 2018-2024)
+    # Normalize the weather once per race, then put it back on every driver row
+    races = normalizeWeather(data.races.reset_index())
+    f1_data = data.with_races(races)
 
     # Get the top 5 drivers dynamically based on points
-    top5_drivers = get_top5_drivers(f1_data)
+    top5_drivers = get_top5_drivers(f1_data.frame)
+
+    # The weather in f1_data is already normalized, reuse it instead of loading the file again
+    weatherData = f1_data.view()
+    # Normalize position to plot values
+    positions = weatherData.frame['Position']
+    weatherData.frame = weatherData.frame.assign(Position=(positions - positions.min()) / (positions.max() - positions.min()))
+
+    conditionList = list(saveWeatherConditions(top5_drivers, weatherData))
+    return f1_data, weatherData, top5_drivers, conditionList
+
+def plot_top5_positions(f1_data, top5_drivers):
+    import matplotlib.pyplot as plt
+
     positions = []
     race_names = []
 
@@ -118,31 +154,13 @@ def visualization12():
     plt.xlabel("Race Name") 
     plt.xticks(rotation='vertical') 
     plt.legend(top5_drivers, bbox_to_anchor=(1,1))
-    plt.show()
-
-    
-    weatherData = pd.read_csv("f1_2023Weather.csv")
-    normalizeWeather(weatherData)
-    # Normalize position to plot values
-    weatherData['Position'] = (weatherData['Position'] - weatherData['Position'].min()) / (weatherData['Position'].max() - weatherData['Position'].min())
+    figures.finish("top5_positions")
 
-    airTemp = []
-    humidity = []
-    airPress = []
-    trackTemp = []
-    windSpeed= []
-    
-    airTemp, humidity, airPress, trackTemp, windSpeed = saveWeatherConditions(top5_drivers, weatherData)
-    conditionList = [airTemp, humidity, airPress, trackTemp, windSpeed]
-    conditionNames = ["Air Temperature", "Relative Humidity", "Air Pressure", "Track Temperature", "Wind Speed"]
+def plot_all_weather_conditions(top5_drivers, conditionList, weatherData):
+    import matplotlib.pyplot as plt
 
-    for condition in conditionList: 
-       print(len(condition))
+    airTemp, humidity, airPress, trackTemp, windSpeed = conditionList
 
-    # For each weather condition, create a plot to show how drivers perform 
-    for i in range(0, len(conditionList)):
-      plotWeatherCondition(top5_drivers, conditionList[i], conditionNames[i], weatherData)
-    
     # Create a final plot with all weather conditions and driver performance
     plt.figure(figsize=(25,6))
     for driver in top5_drivers:
@@ -158,17 +176,48 @@ def visualization12():
     plt.plot(race_names, windSpeed, label = "Wind Speed")
     plt.legend()
     plt.xticks(rotation='vertical')
-    plt.show()
+    figures.finish("weather_all")
+
+def visualization12():
+    f1_data, weatherData, top5_drivers, conditionList = weather_plot_data()
+
+    for condition in conditionList: 
+       print(len(condition))
+
+    plot_top5_positions(f1_data, top5_drivers)
+
+    # For each weather condition, create a plot to show how drivers perform 
+    for i in range(0, len(conditionList)):
+      plotWeatherCondition(top5_drivers, conditionList[i], CONDITION_NAMES[i], weatherData)
+
+    plot_all_weather_conditions(top5_drivers, conditionList, weatherData)
 
-visualization12()
 
 # Functions for visualization 3:
-def load_data():
+def load_data(path=DATA_FILE, columns=DATA_COLUMNS):
+
+    import dataset
+
+    return dataset.open_dataset(path, columns=columns) # parsed once per process, then served from the cache
+
+# Results computed from the dataset, cached on disk until the dataset changes (see memo.py)
+@memo.memoize
+def load_top5_drivers(path=DATA_FILE, columns=DATA_COLUMNS):
+    "Names of the top 5 drivers of the dataset by points."
+    return get_top5_drivers(load_data(path, columns).frame)
+
+@memo.memoize
+def load_rainy_vs_dry(path=DATA_FILE, columns=DATA_COLUMNS):
+    "Average position and points of every driver in rainy and dry races (see analysis.condition_table)."
+    import analysis
 
-    return pd.read_csv("/Users/jessicapinto/Documents/python/CS2520/Data_Analytics_Racing_Data/f1_2023Weather.csv")
+    frame = load_data(path, columns).frame
+    return analysis.condition_table(frame, analysis.weather_buckets(frame, 'Rainfall'))
 
 #Prepare the data for visualization
 def prepare_data(df):
+    import pandas as pd
+
     # Convert the 'Race Date' to datetime for plt
     df['Race Date'] = pd.to_datetime(df['Race Date'])
 
@@ -177,15 +226,11 @@ def prepare_data(df):
 
     return df
 
-# Function to calculate total points for each driver and get the top 5 (like what we did)
-def get_top5_drivers(df):
-    total_points = df.groupby('Driver Name')['Race Point'].sum().reset_index()
-    top5_drivers = total_points.sort_values(by='Race Point', ascending=False).head(5)
-    return top5_drivers['Driver Name']
-
 #Plot performance of a single driver over time
-def plot_driver_performance(df, driver_name):
-    driver_data = df[df['Driver Name'] == driver_name]
+def plot_driver_performance(data, driver_name):
+    import matplotlib.pyplot as plt
+
+    driver_data = data.driver(driver_name)
 
     plt.figure(figsize=(10, 6))
     plt.plot(driver_data['Race Date'], driver_data['Position'], marker='o', label=driver_name)
@@ -201,17 +246,15 @@ def plot_driver_performance(df, driver_name):
     plt.tight_layout()
 
     # Show the plot
-    plt.show()
+    figures.finish("driver_" + str(driver_name))
 
 def visualization3():
   # Load the dataset
-  f1_data = load_data()
+  f1_data = load_data() # shared dataset, already typed and sorted by Race Date
 
-  # Prepare the data (sort by Race Date)
-  f1_data = prepare_data(f1_data)
 
   # Get the top 5 drivers based on points
-  top5_drivers = get_top5_drivers(f1_data)
+  top5_drivers = load_top5_drivers()
 
   # Plot each driver separately
   for driver in top5_drivers:
@@ -220,12 +263,14 @@ def visualization3():
 #visualization3()
 
 #Plot performance of multiple drivers over time
-def plot_top5_performance(df, top5_drivers):
+def plot_top5_performance(data, top5_drivers):
+    import matplotlib.pyplot as plt
+
     plt.figure(figsize=(12, 7))
 
     # Loop through each driver and plot their performance
     for driver_name in top5_drivers:
-        driver_data = df[df['Driver Name'] == driver_name]
+        driver_data = data.driver(driver_name)
         plt.plot(driver_data['Race Date'], driver_data['Position'], marker='o', label=driver_name)
 
     plt.gca().invert_yaxis()  # Invert the y-axis - 1st position at the top
@@ -239,61 +284,47 @@ def plot_top5_performance(df, top5_drivers):
     plt.tight_layout()
 
     # Show the plot
-    plt.show()
+    figures.finish("top5_over_time")
 
 def visualization3Complete():
    # Load the dataset
-    f1_data = load_data()
+    f1_data = load_data() # shared dataset, already typed and sorted by Race Date
 
-    # Prepare the data (sort by Race Date)
-    f1_data = prepare_data(f1_data)
 
     # Get the top 5 drivers based on points
-    top5_drivers = get_top5_drivers(f1_data)
+    top5_drivers = load_top5_drivers()
 
     # Plot performance of top 5 drivers over time
     plot_top5_performance(f1_data, top5_drivers)
 
-visualization3Complete()
 
 # Functions for visualization 4: 
 #Prepare the data for visualization (convert date and sort)
 #because this will be time-based (formatted and ordred for time-based visualization)
 def prepare_data(df):
+    import pandas as pd
+
     df['Race Date'] = pd.to_datetime(df['Race Date'])
     df = df.sort_values(by='Race Date')
     #import pdb; pdb.set_trace()
     return df
 
-#Separate races into rainy and dry based on weather
-def categorize_weather(df):
-    rainy_races = df[df['Rainfall'] == True]  # RAINED
-    dry_races = df[df['Rainfall'] == False]   # DIDNT RAIN
-    return rainy_races, dry_races
-
-#Calculate average positions in rainy vs dry races for top 5 drivers (used the previous formula-summing up and taking 5 head)
-def calculate_avg_position(df, driver_name):
-    return df[df['Driver Name'] == driver_name]['Position'].mean()
+def plot_rainy_vs_dry(data, top5_drivers, table=None):
+    import analysis
+    import matplotlib.pyplot as plt
 
-def plot_rainy_vs_dry(df, top5_drivers):
-    rainy_races, dry_races = categorize_weather(df)
-
-    rainy_positions = []
-    dry_positions = []
-
-    #Calculate average position in rainy and dry conditions for each driver
-    for driver in top5_drivers:
-        rainy_avg = calculate_avg_position(rainy_races, driver)
-        dry_avg = calculate_avg_position(dry_races, driver)
-        rainy_positions.append(rainy_avg)
-        dry_positions.append(dry_avg)
+    #Average position of every driver in rainy and dry races, all drivers in one groupby (see analysis.py)
+    #unless the table is given, e.g. the cached one of load_rainy_vs_dry
+    if table is None:
+        conditions = analysis.weather_buckets(data.frame, 'Rainfall')
+        table = analysis.condition_table(data.frame, conditions)
 
     #horizontal bar chart
-    df_plot = pd.DataFrame({
-        'Driver': top5_drivers,
-        'Rainy': rainy_positions,
-        'Dry': dry_positions
-    }).set_index('Driver')
+    #the top 5 drivers as rows, their average positions in rainy and dry races as columns
+    df_plot = table.pivot(index='Driver Name', columns='Condition', values='Position Mean')
+    df_plot = df_plot.reindex(index=list(top5_drivers), columns=['Rainy', 'Dry'])
+    df_plot.index.name = 'Driver'
+    df_plot.columns.name = None
 
     #Plot the data
     df_plot.plot(kind='barh', figsize=(10,6))
@@ -302,18 +333,26 @@ def plot_rainy_vs_dry(df, top5_drivers):
     plt.xlabel("Average Position")
     plt.ylabel("Drivers")
     plt.grid(True)
-    plt.show()
+    figures.finish("rainy_vs_dry")
 
 def visualization4():
     # Load the dataset
-    f1_data = load_data()
+    f1_data = load_data() # shared dataset, already typed and sorted by Race Date
 
-    # Prepare the data
-    f1_data = prepare_data(f1_data)
 
     # Get the top 5 drivers based on points
-    top5_drivers = get_top5_drivers(f1_data)
+    top5_drivers = load_top5_drivers()
 
     # Plot Rainy vs Dry performance comparison
-    plot_rainy_vs_dry(f1_data, top5_drivers)
-visualization4()
+    plot_rainy_vs_dry(f1_data, top5_drivers, load_rainy_vs_dry())
+
+
+def main():
+    visualization12()
+    #visualization3()
+    visualization3Complete()
+    visualization4()
+
+# the plots are only made when the file is run, render.py imports this module to render them itself
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+# Analysis of driver performance against the weather
+#
+# weather_buckets puts every row of a dataset in a weather condition bucket
+# (rain or dry, quantiles of a weather column, or bands between fixed edges),
+# and condition_table aggregates the position and points of every driver in
+# every bucket with a single groupby. The result is a tidy table, one row per
+# driver and condition, that the plots pick their values from.
+#
+# weather_correlations/weather_sensitivity relate every weather column to the
+# results of every driver, with bootstrap confidence intervals.
+#
+# How to run:
+#    python3 analysis.py --input f1_2023Weather.csv --target Position --workers 4
+#    python3 analysis.py --target "Positions Gained" --replicates 5000 --output sensitivity.csv
+
+import argparse
+import warnings
+
+import numpy as np
+import pandas as pd
+
+# statistics and values condition_table computes by default
+CONDITION_STATS = ('mean', 'median', 'count')
+CONDITION_VALUES = ('Position', 'Race Point')
+
+
+def weather_buckets(frame, column='Rainfall', quantiles=4, edges=None, labels=None):
+    """Weather condition of every row of frame, as a categorical Series named 'Condition'.
+
+    A bool column such as Rainfall gives 'Rainy' and 'Dry'. A numerical column
+    is split at the given edges (e.g. wind bands [0, 2, 4, 10]), or by default
+    into quantiles of its race values ('Q1' is the lowest), so every bucket
+    holds about the same number of races whatever the number of drivers."""
+
+    values = frame[column]
+    if values.dtype == bool:
+        buckets = pd.Categorical(np.where(values.to_numpy(), 'Rainy', 'Dry'), categories=['Rainy', 'Dry'])
+        return pd.Series(buckets, index=frame.index, name='Condition')
+
+    if edges is not None:
+        buckets = pd.cut(values, edges, labels=labels, include_lowest=True)
+        return buckets.rename('Condition')
+
+    # quantile edges over one value per race, then every row gets its race's bucket
+    races = values.groupby(frame['Race Name'], observed=True).first()
+    race_edges = pd.qcut(races, quantiles, retbins=True, duplicates='drop')[1]
+    if labels is None:
+        labels = ['Q{}'.format(i) for i in range(1, len(race_edges))]
+    buckets = pd.cut(values, race_edges, labels=labels, include_lowest=True)
+    return buckets.rename('Condition')
+
+
+def condition_table(frame, buckets, values=CONDITION_VALUES, stats=CONDITION_STATS):
+    """Statistics of values for every driver in every weather condition.
+
+    buckets is the condition of every row of frame (see weather_buckets). All
+    drivers and conditions are aggregated in one groupby pass. Returns one row
+    per driver and condition, with 'Driver Name', 'Condition' and a column per
+    value and statistic, e.g. 'Position Mean' or 'Race Point Count'."""
+
+    grouped = frame[list(values)].groupby([frame['Driver Name'], buckets.rename('Condition')], observed=True)
+    table = grouped.agg(list(stats))
+    table.columns = ["{} {}".format(value, stat.title()) for value, stat in table.columns]
+    return table.reset_index()
+
+
+# weather against performance
+# The correlation of every weather column with the target is computed for every
+# driver at once: the rows are sorted by driver once and every sum the Pearson
+# correlation needs comes from np.add.reduceat over those driver blocks. A
+# bootstrap replicate resamples races and reuses the same code with each row
+# weighted by how often its race was drawn, so it is one more matrix pass.
+WEATHER_COLUMNS = ['Air Temperature', 'Relative Humidity', 'Air Pressure', 'Track Temperature', 'Wind Speed']
+
+# targets weather_sensitivity understands. Positions Gained is grid position minus
+# finishing position, rows starting from the pit lane (grid 0) are left out.
+TARGETS = ('Position', 'Race Point', 'Positions Gained')
+
+
+def _target(frame, target):
+    if target == 'Positions Gained':
+        grid = frame['Race Grid Position'].where(frame['Race Grid Position'] > 0)
+        return (grid - frame['Position']).to_numpy(dtype=float)
+    if target not in TARGETS:
+        raise ValueError("target must be one of {}".format(", ".join(TARGETS)))
+    return frame[target].to_numpy(dtype=float)
+
+
+def _correlation_matrix(x, y, starts, weights):
+    # weighted Pearson correlation of every column of x with y, within each block of
+    # rows (rows sorted by driver, each driver's block begins at starts)
+    wx = x * weights[:, None]
+    wy = (y * weights)[:, None]
+    n = np.add.reduceat(weights, starts)[:, None]
+    sx = np.add.reduceat(wx, starts)
+    sy = np.add.reduceat(wy, starts)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        cov = np.add.reduceat(wx * y[:, None], starts) - sx * sy / n
+        var_x = np.add.reduceat(wx * x, starts) - sx * sx / n
+        var_y = np.add.reduceat(wy * y[:, None], starts) - sy * sy / n
+        return cov / np.sqrt(var_x * var_y)
+
+
+def _bootstrap(x, y, starts, race_codes, replicates, seed):
+    # correlation matrices of `replicates` resamples of the races
+    rng = np.random.default_rng(seed)
+    races = race_codes.max() + 1
+    result = np.empty((replicates, len(starts), x.shape[1]))
+    for i in range(replicates):
+        drawn = np.bincount(rng.integers(0, races, races), minlength=races)
+        result[i] = _correlation_matrix(x, y, starts, drawn[race_codes].astype(float))
+    return result
+
+
+def _prepare(frame, target, weather, min_races):
+    # rows with every value known, sorted by driver; drivers with too few races are left out
+    data = pd.DataFrame({'Driver Name': frame['Driver Name'].astype(str).to_numpy(),
+                         'Race Name': frame['Race Name'].astype(str).to_numpy(),
+                         'Target': _target(frame, target)})
+    data[weather] = frame[weather].to_numpy(dtype=float)
+    data = data.dropna()
+    races = data.groupby('Driver Name')['Race Name'].transform('size')
+    data = data[races >= min_races].sort_values('Driver Name', kind='stable')
+
+    drivers, starts = np.unique(data['Driver Name'].to_numpy(), return_index=True)
+    # center the weather so the sums of squares do not lose precision (pressure is ~1000)
+    x = data[weather].to_numpy()
+    x = x - x.mean(axis=0) if len(x) else x
+    y = data['Target'].to_numpy()
+    race_codes = pd.factorize(data['Race Name'])[0]
+    counts = np.diff(np.append(starts, len(data)))
+    return drivers, starts, counts, x, y, race_codes
+
+
+def weather_correlations(frame, target='Position', weather=WEATHER_COLUMNS, min_races=3):
+    """Correlation between each weather column and target (see TARGETS) for every
+    driver with at least min_races races, as a drivers x weather frame."""
+
+    drivers, starts, counts, x, y, race_codes = _prepare(frame, target, list(weather), min_races)
+    if not len(drivers):
+        return pd.DataFrame(columns=list(weather), index=pd.Index([], name='Driver Name'), dtype=float)
+    matrix = _correlation_matrix(x, y, starts, np.ones(len(y)))
+    return pd.DataFrame(matrix, index=pd.Index(drivers, name='Driver Name'), columns=list(weather))
+
+
+def weather_sensitivity(frame, target='Position', weather=WEATHER_COLUMNS, replicates=1000, confidence=0.95,
+                        workers=1, seed=0, min_races=3):
+    """Ranked weather sensitivity of every driver: one row per driver and weather
+    column with the correlation with target, its bootstrap confidence interval
+    and the number of races, strongest correlation first.
+
+    The races are resampled `replicates` times. With more than one worker the
+    replicates are split over a process pool; the result only depends on seed,
+    not on the number of workers."""
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    if replicates < 1:
+        raise ValueError("replicates must be at least 1")
+    weather = list(weather)
+    drivers, starts, counts, x, y, race_codes = _prepare(frame, target, weather, min_races)
+    columns = ['Driver Name', 'Weather', 'Correlation', 'CI Low', 'CI High', 'Races']
+    if not len(drivers):
+        return pd.DataFrame(columns=columns)
+    correlations = _correlation_matrix(x, y, starts, np.ones(len(y)))
+
+    # fixed size chunks with their own seeds, so any number of workers draws the same samples
+    chunk = 100
+    sizes = [min(chunk, replicates - start) for start in range(0, replicates, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    args = [(x, y, starts, race_codes, size, chunk_seed) for size, chunk_seed in zip(sizes, seeds)]
+    if workers > 1 and len(args) > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            samples = list(executor.map(_bootstrap, *zip(*args)))
+    else:
+        samples = [_bootstrap(*arg) for arg in args]
+    samples = np.concatenate(samples)
+
+    tail = (1 - confidence) / 2 * 100
+    # a driver whose weather never changed in any sample has no interval, without numpy's warning
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        low, high = np.nanpercentile(samples, [tail, 100 - tail], axis=0)
+
+    table = pd.DataFrame({
+        'Driver Name': np.repeat(drivers, len(weather)),
+        'Weather': np.tile(weather, len(drivers)),
+        'Correlation': correlations.ravel(),
+        'CI Low': low.ravel(),
+        'CI High': high.ravel(),
+        'Races': np.repeat(counts, len(weather)),
+    })
+    order = np.argsort(-np.abs(table['Correlation'].fillna(0).to_numpy()), kind='stable')
+    return table.iloc[order].reset_index(drop=True)
+
+
+# command line, also used by f1.py sensitivity
+def main(argv=None, prog=None):
+    import dataset
+
+    aparser = argparse.ArgumentParser(
+        prog=prog,
+        description='Rank how strongly the weather relates to the results of every driver')
+    aparser.add_argument('--input', default='f1_2023Weather.csv', help='dataset written by datamining.py')
+    aparser.add_argument('--target', default='Position', choices=TARGETS, help='result to correlate the weather with')
+    aparser.add_argument('--replicates', default=1000, type=int, help='bootstrap resamples of the races')
+    aparser.add_argument('--confidence', default=0.95, type=float, help='confidence level of the intervals')
+    aparser.add_argument('--workers', default=1, type=int, help='processes computing the bootstrap')
+    aparser.add_argument('--min-races', default=3, type=int, help='leave out drivers with fewer races')
+    aparser.add_argument('--output', default=None, help='csv file for the table, printed when not given')
+    args = aparser.parse_args(argv)
+
+    columns = ['Race Name', 'Race Date', 'Driver Name', 'Position', 'Race Point', 'Race Grid Position']
+    frame = dataset.open_dataset(args.input, columns=columns + WEATHER_COLUMNS).frame
+    table = weather_sensitivity(frame, args.target, replicates=args.replicates, confidence=args.confidence,
+                                workers=args.workers, min_races=args.min_races)
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print("Wrote {} rows to {}".format(len(table), args.output))
+    else:
+        print(table.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+# Benchmark for datamining.load_sessions
+#
+# Uses a local stand-in for the fastf1 session loader (it just sleeps for a
+# fixed latency) so we can measure how much concurrent loading helps without
+# hitting the network. The fake loader can also fail, fail only on the first
+# attempts, or hang, to check the retries, rate limit and timeouts of
+# scheduler.LoadScheduler.
+#
+# How to run:
+#    python3 benchmark_loading.py --events 22 --latency 0.5 --workers 1 4 8
+#    python3 benchmark_loading.py --flaky 3 7 --fail 5 --slow 9 --retries 2 --backoff 0.1 --timeout 1 --rate 20
+
+import argparse
+import threading
+import time
+
+from datamining import load_sessions
+from scheduler import LoadScheduler
+
+
+class FakeSession:
+    "Stand-in for a loaded fastf1 session."
+
+    def __init__(self, race_name):
+        self.race_name = race_name
+
+
+def make_loader(latency, failing=(), flaky=(), slow=(), slow_latency=5.0, flaky_failures=1):
+    """Returns a loader that waits `latency` seconds. It always fails for the
+    `failing` event names, fails the first `flaky_failures` attempts of the
+    `flaky` ones and waits `slow_latency` seconds for the `slow` ones."""
+
+    calls = {}
+    lock = threading.Lock()
+
+    def loader(race_event):
+        name = race_event['OfficialEventName']
+        with lock:
+            calls[name] = calls.get(name, 0) + 1
+            attempt = calls[name]
+        time.sleep(slow_latency if name in slow else latency)
+        if name in failing:
+            raise RuntimeError('simulated load failure')
+        if name in flaky and attempt <= flaky_failures:
+            raise ConnectionError('simulated flaky load, attempt {}'.format(attempt))
+        return FakeSession(name)
+    return loader
+
+
+def run(race_events, workers, loader):
+    "Loads every event and returns (seconds, loaded names, failed names)."
+
+    start = time.perf_counter()
+    loaded = []
+    failed = []
+    for race_event, race_stats, error in load_sessions(race_events, workers=workers, loader=loader):
+        if error is not None:
+            failed.append(race_event['OfficialEventName'])
+        else:
+            loaded.append(race_stats.race_name)
+    return time.perf_counter() - start, loaded, failed
+
+
+if __name__ == '__main__':
+    aparser = argparse.ArgumentParser(
+        description='Benchmark sequential vs concurrent session loading')
+    aparser.add_argument('--events', default=22, type=int, help='number of fake events')
+    aparser.add_argument('--latency', default=0.25, type=float, help='seconds per session load')
+    aparser.add_argument('--workers', default=[1, 4, 8], type=int, nargs='+', help='worker counts to try')
+    aparser.add_argument('--fail', default=[], type=int, nargs='*', help='event numbers that should fail')
+    aparser.add_argument('--flaky', default=[], type=int, nargs='*',
+                         help='event numbers whose first --flaky-failures loads fail')
+    aparser.add_argument('--flaky-failures', default=1, type=int, help='failed loads of a flaky event')
+    aparser.add_argument('--slow', default=[], type=int, nargs='*', help='event numbers that take --slow-latency')
+    aparser.add_argument('--slow-latency', default=5.0, type=float, help='seconds per slow session load')
+    aparser.add_argument('--retries', default=0, type=int, help='retries of a failed load')
+    aparser.add_argument('--backoff', default=0.1, type=float, help='seconds before the first retry')
+    aparser.add_argument('--rate', default=None, type=float, help='most loads started per second')
+    aparser.add_argument('--timeout', default=None, type=float, help='seconds before a load counts as failed')
+    args = aparser.parse_args()
+
+    def names(numbers):
+        return {'Race {:02d}'.format(i) for i in numbers}
+
+    race_events = [{'OfficialEventName': 'Race {:02d}'.format(i)} for i in range(1, args.events + 1)]
+    failing = names(args.fail)
+    # without enough retries a flaky event fails, and a slow one fails when it takes longer than the timeout
+    lost = failing | (names(args.flaky) if args.flaky_failures > args.retries else set())
+    if args.timeout is not None and args.slow_latency > args.timeout:
+        lost |= names(args.slow)
+    expected = [e['OfficialEventName'] for e in race_events if e['OfficialEventName'] not in lost]
+
+    baseline = None
+    for workers in args.workers:
+        # a new loader per run, so every run sees the flaky events fail again
+        loader = make_loader(args.latency, failing, names(args.flaky), names(args.slow), args.slow_latency,
+                             args.flaky_failures)
+        scheduler = LoadScheduler(loader, retries=args.retries, backoff=args.backoff, rate=args.rate,
+                                  timeout=args.timeout)
+        seconds, loaded, failed = run(race_events, workers, scheduler)
+        # concurrent loading must not change the order of the output rows
+        assert loaded == expected, 'events came back out of order or were not retried'
+        baseline = baseline or seconds
+        print("workers={:<3} {:7.2f}s  speedup {:5.1f}x  loaded {}  failed {}  retried {}".format(
+            workers, seconds, baseline / seconds, len(loaded), len(failed), len(scheduler.retried())))
@@ -0,0 +1,269 @@
+# Out-of-core aggregation of datasets larger than memory
+#
+# The dataset, or a directory of lap or telemetry files, is read in chunks of
+# at most CHUNK_ROWS rows: csv files with pandas' chunked reader, parquet files
+# one record batch at a time. Every chunk is reduced to a Partial (sums and
+# counts per group) on a process pool, and the partials are merged in chunk
+# order as they come back, so memory only holds a few chunks and the small
+# per-group tables, never the whole dataset. Only statistics that merge exactly
+# are offered (sum, count and mean), and the results are the same as the
+# in-memory ones (standings.top_drivers, analysis.condition_table, ...).
+#
+# How to run:
+#    python3 chunked.py --input f1_2023Weather.csv --by points --workers 4
+#    python3 chunked.py --input f1.parquet --by conditions --column "Wind Speed" --quantiles 4
+#    python3 chunked.py --input f1_laps --by positions --chunk-rows 500000   (every lap file of a dataset)
+
+import argparse
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+import dataset
+
+CHUNK_ROWS = 100000
+
+# statistics that can be computed from partial aggregates
+MERGEABLE_STATS = ('sum', 'count', 'mean')
+
+
+def _files(path):
+    # a partitioned dataset lists its files in race order in its index
+    if dataset.is_partitioned(path):
+        return [os.path.join(path, partition['file']) for partition in dataset.read_partition_index(path)['partitions']]
+    # a directory holds one file per race (datamining.py --laps/--telemetry)
+    if os.path.isdir(path):
+        return sorted(os.path.join(path, name) for name in os.listdir(path)
+                      if dataset.is_parquet(name) or name.endswith('.csv'))
+    return [path]
+
+
+def read_chunks(path, columns=None, chunk_rows=CHUNK_ROWS):
+    """Yields the dataset at path (a file, a partitioned dataset, or a directory
+    of lap or telemetry files) as typed frames of at most chunk_rows rows, in file order."""
+
+    for file in _files(path):
+        if dataset.is_parquet(file):
+            import pyarrow.parquet
+            for batch in pyarrow.parquet.ParquetFile(file).iter_batches(batch_size=chunk_rows, columns=columns):
+                frame = batch.to_pandas()
+                yield frame.astype({c: 'Int64' for c in dataset.MS_COLUMNS if c in frame.columns})
+        else:
+            for chunk in pd.read_csv(file, usecols=columns, chunksize=chunk_rows):
+                yield dataset.typed(chunk)
+
+
+class Partial:
+    """Sums and counts of value columns per group of a part of the dataset.
+
+    table is indexed by the group keys and holds '<value> Sum' and '<value>
+    Count' for every value, and where the group first appears in the dataset
+    sorted by race date ('First Date', 'First Row'). The partials of two parts
+    merge into the partial of both."""
+
+    def __init__(self, keys, values, table=None):
+        self.keys = list(keys)
+        self.values = list(values)
+        self.table = table
+
+    @classmethod
+    def of(cls, frame, keys, values, offset=0):
+        "Partial of one chunk, offset is the row number of its first row in the whole dataset."
+
+        data = pd.DataFrame({key: frame[key].astype(str).where(frame[key].notna()) for key in keys})
+        for value in values:
+            data[value + ' Sum'] = frame[value].to_numpy()
+            data[value + ' Count'] = frame[value].notna().to_numpy().astype('int64')
+        # open_dataset sorts the rows by race date, ties keep their file order
+        data['First Date'] = dataset.timestamp_ms(frame['Race Date']) if 'Race Date' in frame.columns else 0
+        data['First Row'] = np.arange(offset, offset + len(frame))
+        return cls(keys, values, cls._reduce(data, keys, values))
+
+    @staticmethod
+    def _reduce(data, keys, values):
+        sums = [column for value in values for column in (value + ' Sum', value + ' Count')]
+        grouped = data.groupby(keys, sort=False)
+        first = data.sort_values(['First Date', 'First Row'], kind='stable').groupby(keys, sort=False)
+        return grouped[sums].sum().join(first[['First Date', 'First Row']].first())
+
+    def merge(self, other):
+        "Returns the partial of both parts."
+        if self.table is None:
+            return other
+        if other.table is None:
+            return self
+        data = pd.concat([self.table, other.table]).reset_index()
+        return Partial(self.keys, self.values, self._reduce(data, self.keys, self.values))
+
+    def result(self, stats=('sum', 'count', 'mean')):
+        """Frame with a '<value> <Stat>' column per value and statistic, one row
+        per group in the order the groups first appear in the dataset."""
+
+        unknown = [stat for stat in stats if stat not in MERGEABLE_STATS]
+        if unknown:
+            raise ValueError("statistics must be some of {}, not {}".format(
+                ", ".join(MERGEABLE_STATS), ", ".join(unknown)))
+        table = self.table
+        if table is None:
+            table = pd.DataFrame(columns=self.keys + ['First Date', 'First Row']).set_index(self.keys)
+        table = table.sort_values(['First Date', 'First Row'], kind='stable')
+        columns = {}
+        for value in self.values:
+            total, count = table[value + ' Sum'], table[value + ' Count'].astype('int64')
+            for stat in stats:
+                columns["{} {}".format(value, stat.title())] = {
+                    'sum': total, 'count': count, 'mean': total / count.where(count > 0)}[stat]
+        return pd.DataFrame(columns, index=table.index)
+
+
+def _chunk_partial(frame, keys, values, offset, buckets):
+    if buckets is not None:
+        import analysis
+        frame = frame.assign(Condition=analysis.weather_buckets(frame, **buckets))
+    return Partial.of(frame, keys, values, offset)
+
+
+def aggregate(path, keys, values, buckets=None, workers=1, chunk_rows=CHUNK_ROWS):
+    """Partial of the whole dataset at path, built chunk by chunk.
+
+    keys are the columns to group by, values the columns to add up. buckets
+    are analysis.weather_buckets arguments (column, edges, labels); when given
+    every row also gets its 'Condition', which can be used as a key. With more
+    than one worker the chunks are reduced on a process pool, keeping at most
+    2 * workers chunks in memory."""
+
+    needed = [key for key in keys if key != 'Condition'] + list(values) + ['Race Date']
+    if buckets is not None:
+        needed += ['Race Name', buckets['column']]
+    stored = _columns(path)
+    missing = [column for column in list(keys) + list(values) if column != 'Condition' and column not in stored]
+    if missing:
+        raise ValueError("{} has no column {}".format(path, ", ".join(missing)))
+    columns = [column for column in dict.fromkeys(needed) if column in stored]
+    partial = Partial(keys, values)
+    offset = 0
+
+    if workers <= 1:
+        for chunk in read_chunks(path, columns, chunk_rows):
+            partial = partial.merge(_chunk_partial(chunk, keys, values, offset, buckets))
+            offset += len(chunk)
+        return partial
+
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for chunk in read_chunks(path, columns, chunk_rows):
+            pending.append(pool.submit(_chunk_partial, chunk, keys, values, offset, buckets))
+            offset += len(chunk)
+            if len(pending) >= 2 * workers:
+                partial = partial.merge(pending.popleft().result())
+        while pending:
+            partial = partial.merge(pending.popleft().result())
+    return partial
+
+
+def _columns(path):
+    # column names of the first file, without reading any rows
+    first = _files(path)[0]
+    if dataset.is_parquet(first):
+        import pyarrow.parquet
+        return pyarrow.parquet.read_schema(first).names
+    return list(pd.read_csv(first, nrows=0).columns)
+
+
+def race_values(path, column, chunk_rows=CHUNK_ROWS):
+    "The value of a race level column of every race (first known value of each race), read chunk by chunk."
+
+    races = None
+    for chunk in read_chunks(path, ['Race Name', column], chunk_rows):
+        values = chunk[column].groupby(chunk['Race Name'].astype(str), sort=False).first()
+        races = values if races is None else pd.concat([races, values]).groupby(level=0, sort=False).first()
+    return races if races is not None else pd.Series(dtype=float)
+
+
+def points_totals(path, workers=1, chunk_rows=CHUNK_ROWS):
+    "Points of every driver over the whole dataset, drivers in the order they first appear (like Standings.totals)."
+    table = aggregate(path, ['Driver Name'], ['Race Point'], workers=workers, chunk_rows=chunk_rows).result(['sum'])
+    return table['Race Point Sum'].rename('Race Point')
+
+
+def top_drivers(path, k=5, workers=1, chunk_rows=CHUNK_ROWS):
+    "Names of the k drivers with the most points, leader first, ties by who appeared first (like standings.top_drivers)."
+    totals = points_totals(path, workers, chunk_rows)
+    # a stable sort keeps tied drivers in order of appearance
+    best = totals.iloc[np.argsort(-totals.to_numpy(), kind='stable')[:k]]
+    return pd.Series(best.index.to_numpy(), name='Driver Name')
+
+
+def average_positions(path, workers=1, chunk_rows=CHUNK_ROWS):
+    "Average finishing position of every driver, by driver name."
+    table = aggregate(path, ['Driver Name'], ['Position'], workers=workers, chunk_rows=chunk_rows).result(['mean'])
+    return table['Position Mean'].rename('Position').sort_index()
+
+
+def condition_table(path, column='Rainfall', quantiles=4, edges=None, labels=None,
+                    values=('Position', 'Race Point'), stats=('mean', 'count'), workers=1, chunk_rows=CHUNK_ROWS):
+    """analysis.condition_table(frame, analysis.weather_buckets(frame, column, ...))
+    of the whole dataset, without holding it in memory.
+
+    A numerical column without edges is split into quantiles of its race values,
+    which takes one extra pass over the race name and that column."""
+
+    if edges is None and column != 'Rainfall':
+        races = race_values(path, column, chunk_rows)
+        edges = pd.qcut(races, quantiles, retbins=True, duplicates='drop')[1]
+        if labels is None:
+            labels = ['Q{}'.format(i) for i in range(1, len(edges))]
+    buckets = {'column': column, 'edges': edges, 'labels': labels}
+    partial = aggregate(path, ['Driver Name', 'Condition'], list(values), buckets, workers, chunk_rows)
+    table = partial.result(stats).reset_index()
+
+    # same order as the in-memory groupby: by driver name, then by condition
+    if column == 'Rainfall':
+        conditions = ['Rainy', 'Dry']
+    elif labels is not None:
+        conditions = list(labels)
+    else:
+        conditions = [str(bucket) for bucket in pd.cut(pd.Series(dtype=float), edges, include_lowest=True).cat.categories]
+    table['Condition'] = pd.Categorical(table['Condition'], categories=conditions)
+    return table.sort_values(['Driver Name', 'Condition'], kind='stable').reset_index(drop=True)
+
+
+# command line, also used by f1.py aggregate
+def main(argv=None, prog=None):
+    aparser = argparse.ArgumentParser(
+        prog=prog,
+        description='Aggregate a dataset larger than memory chunk by chunk')
+    aparser.add_argument('--input', default='f1_2023Weather.csv',
+                         help='dataset written by datamining.py, or a directory of its lap or telemetry files')
+    aparser.add_argument('--by', default='points', choices=['points', 'positions', 'conditions'],
+                         help='points: championship points per driver, positions: average position per driver, '
+                              'conditions: position and points per driver and weather condition')
+    aparser.add_argument('--column', default='Rainfall', help='weather column of the conditions (with --by conditions)')
+    aparser.add_argument('--quantiles', default=4, type=int, help='quantile buckets of a numerical --column')
+    aparser.add_argument('--workers', default=1, type=int, help='processes aggregating the chunks')
+    aparser.add_argument('--chunk-rows', default=CHUNK_ROWS, type=int, help='rows read at a time')
+    aparser.add_argument('--output', default=None, help='csv file for the result, printed when not given')
+    args = aparser.parse_args(argv)
+    if args.workers < 1 or args.chunk_rows < 1:
+        aparser.error('--workers and --chunk-rows must be at least 1')
+
+    if args.by == 'points':
+        table = points_totals(args.input, args.workers, args.chunk_rows).sort_values(ascending=False, kind='stable')
+        table = table.reset_index()
+    elif args.by == 'positions':
+        table = average_positions(args.input, args.workers, args.chunk_rows).reset_index()
+    else:
+        table = condition_table(args.input, args.column, args.quantiles, workers=args.workers,
+                                chunk_rows=args.chunk_rows)
+    if args.output:
+        table.to_csv(args.output, index=False)
+        print("Wrote {} rows to {}".format(len(table), args.output))
+    else:
+        print(table.to_string(index=False))
+
+
+if __name__ == '__main__':
+    main()
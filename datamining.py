@@ -1,127 +1,911 @@
-import fastf1
+import numpy as np
 import pandas as pd
 import csv
 import argparse
+import hashlib
+import json
+import os
+import re
+import shutil
+import warnings
 
-def get_dataset(filename, rows=None):
-    output_data = []
+import dataset
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from functools import partial
+from metrics import Metrics
+from scheduler import LoadScheduler
+
+def get_dataset(filename, rows=None, workers=1, seasons=(2023,), checkpoint=None, since=None, append=False,
+                progress=False, layout='flat', laps=False, telemetry=False, lap_weather=False, weather_stats=(),
+                metrics=None, retries=0, backoff=1.0, rate=None, timeout=None, events=None, rounds=None,
+                start=None, end=None, drivers=None, teams=None):
+    # fastf1 takes about a second to import, only pay for it when races are collected
+    import fastf1
+
+    # stage and event timings of the run, see metrics.py (datamining.py --metrics-out)
+    metrics = metrics or Metrics()
+
+    failed_events = []
     #driver_country_data = {}
 
-    events = fastf1.get_event_schedule(2023)
+    # in append mode only races after the last one already in the file are collected
+    if append and since is None:
+        since = _last_race_date(filename, layout)
+    now = pd.Timestamp.now()
 
-    for evnt in events['OfficialEventName']:
-    #for idx, race_event in events.iterrows(): 
-    #import pdb; pdb.set_trace()
+    # the checkpoint manifest remembers which races earlier runs already extracted
+    manifest = _read_manifest(checkpoint) if checkpoint else None
 
-        race_name = evnt
-        # found directly from API to extra event data by name
-        race_event = events.get_event_by_name(evnt)
-        race_country = race_event['Country']
-        race_loc = race_event['Location']
-        race_format = race_event['EventFormat']
-        race_date = race_event['EventDate']
+    # look up every event first so the sessions can be loaded ahead of time
+    race_events = []
+    for season in seasons:
+        with metrics.stage('schedule'):
+            schedule = fastf1.get_event_schedule(season)
 
-        # skip test events to only aggregate real race data
-        is_test_event = race_event.is_testing()
-        if is_test_event:
-            continue
+        # event filters are checked on the schedule itself, a race they leave out is never loaded
+        wanted = _event_mask(schedule, events=events, rounds=rounds, start=start, end=end)
+        metrics.count('events filtered out', int((~wanted).sum()))
+        for evnt in schedule.loc[wanted, 'OfficialEventName']:
+        #for idx, race_event in events.iterrows(): 
+        #import pdb; pdb.set_trace()
+
+            # found directly from API to extra event data by name
+            with metrics.stage('event lookup', event=evnt):
+                race_event = schedule.get_event_by_name(evnt)
+
+            # skip test events to only aggregate real race data
+            is_test_event = race_event.is_testing()
+            if is_test_event:
+                continue
+
+            # incremental runs skip races we already have and races not run yet
+            if since is not None and not since < race_event['EventDate'] <= now:
+                continue
+            race_events.append((_event_key(season, race_event), race_event))
+
+    # lap and telemetry files written next to the dataset, one per race
+    laps = laps or lap_weather
+    details = [kind for kind, wanted in (('laps', laps), ('telemetry', telemetry)) if wanted]
+    if telemetry and workers > 1:
+        # a session with telemetry takes hundreds of MB, never hold more than one
+        print("--telemetry loads one session at a time, ignoring --workers {}".format(workers))
+        workers = 1
+
+    # only load the sessions the checkpoint does not already have
+    completed = set()
+    if manifest is not None:
+        with metrics.stage('checkpoint check'):
+            settings = {kind: _detail_settings(kind, drivers, teams, lap_weather) for kind in details}
+            completed = {key for key, race_event in race_events if _is_checkpointed(checkpoint, manifest, key, weather_stats)
+                         and _has_details(filename, manifest, key, settings)}
+        print("{} of {} races already extracted in {}".format(len(completed), len(race_events), checkpoint))
+    to_load = [race_event for key, race_event in race_events if key not in completed]
+
+    # sessions come back in schedule order no matter how many workers load them
+    # failed loads are retried with backoff, under a shared rate limit and timeout (see scheduler.py)
+    loader = LoadScheduler(partial(_load_session, laps=laps, telemetry=telemetry, metrics=metrics),
+                           retries=retries, backoff=backoff, rate=rate, timeout=timeout, metrics=metrics)
+    sessions = load_sessions(to_load, workers=workers, loader=loader)
+    # rows are written out race by race instead of being kept in memory
+    sink = _open_sink(filename, append=append, layout=layout)
+    try:
+        for count, (key, race_event) in enumerate(race_events, 1):
+            race_name = race_event['OfficialEventName']
+            if key in completed:
+                with metrics.stage('checkpoint read', event=race_name):
+                    race_frame = _read_checkpoint(checkpoint, manifest, key)
+                # checkpoints written before the millisecond columns existed
+                missing = [column for column in dataset.MS_COLUMNS if column not in race_frame.columns]
+                if missing:
+                    race_frame = race_frame.assign(**dataset.ms_columns(race_frame, missing))
+                    race_frame = race_frame[dataset.flat_order(race_frame.columns)]
+                race_frame = race_frame[_driver_mask(race_frame, drivers, teams)]
+                metrics.record(race_name, key=key, status='checkpoint')
+            else:
+                # time spent waiting for the loads running in the background
+                with metrics.stage('load wait', event=race_name):
+                    race_event, race_stats, error = next(sessions)
+
+                # a failed load only costs us this race, keep going with the rest
+                if error is not None:
+                    print("Failed to load {}: {}".format(race_name, error))
+                    failed_events.append((race_name, error))
+                    metrics.record(race_name, key=key, status='failed', error=str(error))
+                    continue
+
+                with metrics.stage('build rows', event=race_name):
+                    race_frame = _race_frame(race_event, race_stats, weather_stats, metrics=metrics)
+
+                # when the API adds new races we have no data for, we must skip!
+                if race_frame is None:
+                    print("Skipping {} {}- there is no data.".format(race_name, race_stats.date))
+                    metrics.record(race_name, key=key, status='no data')
+                    continue
+                selected_frame = race_frame[_driver_mask(race_frame, drivers, teams)]
+                selected = set(selected_frame['Driver ID'].astype(str)) if drivers or teams else None
+                for kind in details:
+                    with metrics.stage(kind, event=race_name):
+                        written = _write_details(filename, kind, key, race_name, race_stats,
+                                                 lap_weather=lap_weather, drivers=selected)
+                    metrics.count('{} bytes written'.format(kind), written)
+                # the checkpoint keeps every driver, so a rerun with other driver or team filters can use it,
+                # but the detail files only hold the selected ones, which the manifest records
+                if manifest is not None:
+                    with metrics.stage('checkpoint write', event=race_name):
+                        _write_checkpoint(checkpoint, manifest, key, race_event, race_frame, weather_stats,
+                                          {kind: _detail_settings(kind, drivers, teams, lap_weather) for kind in details})
+                race_frame = selected_frame
+                # release the session (and its laps and telemetry) before the next one is loaded
+                race_stats = None
+                metrics.record(race_name, key=key, status='loaded')
+
+            # no driver of this race passed --drivers/--teams
+            if not len(race_frame):
+                metrics.record(race_name, rows=0)
+                continue
+
+            if progress:
+                print("[{}/{}] {}: {} drivers".format(
+                    count, len(race_events), race_event['OfficialEventName'], len(race_frame)))
+
+            # if rows EXISTS (is not None) only write up to that many rows
+            if rows:
+                race_frame = race_frame.iloc[:rows - sink.rows]
+            with metrics.stage('write', event=race_name):
+                sink.write(race_frame, race_id=_race_id(key))
+            metrics.record(race_name, rows=len(race_frame))
+            if rows and sink.rows >= rows:
+                break # EXIT IF the function reaches the specific number of rows
+    except BaseException:
+        sink.abort()
+        raise
+    finally:
+        sessions.close()
+
+    if sink.rows == 0:
+        print("No new races since {}.".format(since) if append else "No race data found.")
+    with metrics.stage('write'):
+        sink.close()
+    metrics.count('rows', sink.rows)
+    metrics.count('bytes written', sink.bytes)
+    metrics.count('events failed', len(failed_events))
+    _report_failures(failed_events, loader.attempts)
+    retried = loader.retried()
+    if retried:
+        print("{} race(s) needed more than one load attempt: {}".format(len(retried), ", ".join(retried)))
+
+# event filters (--events, --rounds, --from, --to) as one boolean mask over a season's
+# schedule. events are parts of event names, countries or locations, e.g. "monaco",
+# matched without case; start and end are inclusive event dates.
+def _event_mask(schedule, events=None, rounds=None, start=None, end=None):
+    mask = pd.Series(True, index=schedule.index)
+    if events:
+        text = schedule['OfficialEventName'].astype(str)
+        for column in ('EventName', 'Country', 'Location'):
+            if column in schedule.columns:
+                text = text + ' ' + schedule[column].astype(str)
+        mask &= text.str.contains('|'.join(re.escape(event) for event in events), case=False, regex=True)
+    if rounds:
+        mask &= schedule['RoundNumber'].isin(list(rounds))
+    if start is not None:
+        mask &= schedule['EventDate'] >= start
+    if end is not None:
+        mask &= schedule['EventDate'] <= end
+    return mask
+
+# driver and team filters (--drivers, --teams) as one boolean mask over the rows of a
+# race, fresh or read back from the checkpoint. drivers are driver ids (max_verstappen)
+# or numbers (1), teams parts of team names ("red bull"), both matched without case.
+def _driver_mask(race_frame, drivers=None, teams=None):
+    mask = np.ones(len(race_frame), dtype=bool)
+    if drivers:
+        wanted = [str(driver).lower() for driver in drivers]
+        mask &= (race_frame['Driver Name'].astype(str).str.lower().isin(wanted).to_numpy()
+                 | race_frame['Driver ID'].astype(str).str.lower().isin(wanted).to_numpy())
+    if teams:
+        pattern = '|'.join(re.escape(team) for team in teams)
+        mask &= race_frame['Driver Team'].astype(str).str.contains(pattern, case=False, regex=True).to_numpy()
+    return mask
+
+# build the output rows of one race as a single frame, one row per driver.
+# Everything is assigned column by column: race information and weather are
+# scalars broadcast to every row, driver results are copied as whole columns.
+def _race_frame(race_event, race_stats, weather_stats=(), metrics=None):
+    # extract driver race results
+    race_results = race_stats.results
+    if race_results.empty:
+        return None
+
+    race_name = race_event['OfficialEventName']
+    driver_number = race_results['DriverNumber']
+    # int64 ms times, decoded once here instead of on every load (see dataset.MS_SOURCES)
+    race_time_ms, gap_ms = dataset.race_time_ms(race_results['Time'], race_results['Position'],
+                                                np.zeros(len(race_results)))
 
-        #load up data for race stat
-        race_stats = race_event.get_race()
-        race_stats.load(laps=False, telemetry=False, messages=False)
+    # weather data, every statistic comes from the same single pass
+    with metrics.stage('weather', event=race_name) if metrics else nullcontext():
+        weather = _weather_stats(race_stats.weather_data, weather_stats)
+
+    return pd.DataFrame({
+        # set race information
+        'Race Name': race_name,
+        'Race Location': "{},{}".format(race_event['Location'], race_event['Country']),
+        'Race Date': race_event['EventDate'],
+        'Race Format': race_event['EventFormat'],
         # this is the race start TIME (different from event date)
-        race_ts = race_stats.date
+        'Race Start Time': race_stats.date,
+
+        # set weather information, averaged over the whole race
+        'Air Temperature': weather.pop('Air Temperature'),
+        'Relative Humidity': weather.pop('Relative Humidity'),
+        'Air Pressure': weather.pop('Air Pressure'),
+        'Rainfall': weather.pop('Rainfall'), # if its raining during the race, it will be 'True'
+        'Track Temperature': weather.pop('Track Temperature'),
+        'Wind Speed': weather.pop('Wind Speed'),
+        'Race Date Ms': dataset.timestamp_ms(pd.Series(race_event['EventDate'], index=race_results.index)),
+        'Race Start Time Ms': dataset.timestamp_ms(pd.Series(race_stats.date, index=race_results.index)),
+        # optional min/max/std/percentiles/rain columns (--weather-stats)
+        **weather,
+
+        # add results and per driver info
+        'Driver ID': driver_number.to_numpy(),
+        'Driver Name': race_results['DriverId'].to_numpy(),
+        'Driver Number and Race Name': (driver_number.astype(str) + " : " + race_name).to_numpy(),
+        'Driver Team': race_results['TeamName'].to_numpy(),
+        #'Driver Country': race_results['CountryCode'].to_numpy(), # dropping country attribute
+        'Position': race_results['Position'].to_numpy(),
+        'Race Time': race_results['Time'].to_numpy(),
+        'Race Point': race_results['Points'].to_numpy(),
+        'Race Grid Position': race_results['GridPosition'].to_numpy(), # what number they were at when starting
+        'Race Time Ms': race_time_ms,
+        'Gap To Winner Ms': gap_ms,
+    })
+
+# weather statistics
+# The weather channels are copied into one float array once per session and every
+# statistic is a numpy reduction over its columns; the percentiles all come from a
+# single nanpercentile call. The means and the Rainfall flag are always computed,
+# the other statistics only when asked for:
+#   min, max, std, pNN (e.g. p10, p90), rain_fraction, first_rain
+WEATHER_STATS = ('min', 'max', 'std', 'rain_fraction', 'first_rain')
+
+# "min,max,p90" to a list of statistics
+def parse_weather_stats(text):
+    stats = [stat.strip().lower() for stat in text.split(',') if stat.strip()]
+    for stat in stats:
+        percentile = re.fullmatch(r'p(\d+)', stat)
+        if stat not in WEATHER_STATS + ('mean',) and not (percentile and int(percentile.group(1)) <= 100):
+            raise ValueError(stat)
+    return [stat for stat in dict.fromkeys(stats) if stat != 'mean']
+
+def _weather_stats(weather_data, stats=()):
+    channels = [source for source in WEATHER_SOURCE_COLUMNS if source != 'Rainfall']
+    names = [WEATHER_SOURCE_COLUMNS[source] for source in channels]
+    values = weather_data[channels].to_numpy(dtype=float)
+    rain = weather_data['Rainfall'].to_numpy(dtype=bool)
+    percentiles = [stat for stat in stats if stat not in WEATHER_STATS]
+
+    columns = {}
+    # a race without weather samples (or a channel without values) gets NaN, without numpy's warnings
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)
+        reductions = {'mean': np.nanmean, 'min': np.nanmin, 'max': np.nanmax, 'std': np.nanstd}
+        for stat in ['mean'] + [stat for stat in stats if stat in reductions]:
+            result = reductions[stat](values, axis=0) if len(values) else np.full(len(names), np.nan)
+            columns.update(zip((dataset.weather_stat_column(name, stat) for name in names), result))
+        if percentiles:
+            qs = [int(stat[1:]) for stat in percentiles]
+            result = np.nanpercentile(values, qs, axis=0) if len(values) else np.full((len(qs), len(names)), np.nan)
+            for stat, row in zip(percentiles, result):
+                columns.update(zip((dataset.weather_stat_column(name, stat) for name in names), row))
+
+    columns['Rainfall'] = bool(rain.any())
+    if 'rain_fraction' in stats:
+        columns['Rainfall Fraction'] = rain.mean() if len(rain) else np.nan
+    if 'first_rain' in stats:
+        # session time of the first sample with rain, NaT for a dry race
+        columns['First Rain Time'] = np.timedelta64('NaT', 'ns')
+        if rain.any():
+            columns['First Rain Time'] = weather_data['Time'].iloc[rain.argmax()]
+    return columns
+
+# lap and telemetry output
+# --laps and --telemetry write one file per race next to the dataset, e.g.
+# f1_laps/2023_05.csv and f1_telemetry/2023_05.csv for f1.csv. Each file is
+# written in chunks of at most DETAIL_CHUNK_ROWS rows, so memory only ever
+# holds the session being written, never a whole season.
+DETAIL_CHUNK_ROWS = 100000
+
+# telemetry samples are a few ms apart, keep the fractional seconds in csv files
+DETAIL_DATE_FORMAT = '%Y-%m-%d %H:%M:%S.%f'
+
+# fastf1 column -> our column
+LAP_SOURCE_COLUMNS = {
+    'LapNumber': 'Lap Number',
+    'LapTime': 'Lap Time',
+    'LapStartTime': 'Lap Start Time',
+    'Time': 'Lap End Time',
+    'Sector1Time': 'Sector 1 Time',
+    'Sector2Time': 'Sector 2 Time',
+    'Sector3Time': 'Sector 3 Time',
+    'Stint': 'Stint',
+    'Compound': 'Compound',
+    'TyreLife': 'Tyre Life',
+    'Position': 'Position',
+    'PitInTime': 'Pit In Time',
+    'PitOutTime': 'Pit Out Time',
+    'TrackStatus': 'Track Status',
+}
+WEATHER_SOURCE_COLUMNS = {
+    'AirTemp': 'Air Temperature',
+    'Humidity': 'Relative Humidity',
+    'Pressure': 'Air Pressure',
+    'Rainfall': 'Rainfall',
+    'TrackTemp': 'Track Temperature',
+    'WindSpeed': 'Wind Speed',
+}
+TELEMETRY_SOURCE_COLUMNS = {
+    'Date': 'Sample Date',
+    'SessionTime': 'Session Time',
+    'Speed': 'Speed',
+    'RPM': 'RPM',
+    'nGear': 'Gear',
+    'Throttle': 'Throttle',
+    'Brake': 'Brake',
+    'DRS': 'DRS',
+}
 
-        # extract driver race results
-        race_results = race_stats.results
+def detail_dir(filename, kind):
+    "Directory of the lap or telemetry files of a dataset, e.g. f1_laps for f1.csv"
+    return "{}_{}".format(os.path.splitext(filename)[0], kind)
 
-        # when the API adds new races we have no data for, we must skip!
-        if race_results.empty:
-            print("Skipping {} {}- there is no data.".format(race_name, race_stats.date))
+def _detail_path(filename, kind, key):
+    # same file name as the race's checkpoint, in the dataset's format
+    name = os.path.splitext(_checkpoint_filename(key))[0]
+    ext = '.parquet' if dataset.is_parquet(filename) else '.csv'
+    return os.path.join(detail_dir(filename, kind), name + ext)
+
+def _detail_frame(race_id, race_name, driver_numbers, driver_names, source, columns):
+    frame = pd.DataFrame({
+        dataset.RACE_KEY: race_id,
+        # the flat dataset has no 'Race ID', its rows are matched by race name
+        'Race Name': race_name,
+        'Driver ID': driver_numbers,
+        'Driver Name': driver_names,
+    }, index=range(len(source)))
+    for source_column, column in columns.items():
+        if source_column in source.columns:
+            frame[column] = source[source_column].to_numpy()
+    return frame
+
+# weather of every lap: the weather sample nearest to the lap's start (its end if
+# the start is unknown). fastf1 samples the weather about once a minute, so this
+# keeps the changes during a race that the whole-race averages of the dataset lose.
+def _lap_weather(frame, weather_data):
+    times = frame['Lap Start Time'] if 'Lap Start Time' in frame.columns else frame['Lap End Time']
+    if 'Lap End Time' in frame.columns:
+        times = times.fillna(frame['Lap End Time'])
+    weather = weather_data[['Time'] + list(WEATHER_SOURCE_COLUMNS)].rename(columns=WEATHER_SOURCE_COLUMNS)
+    weather = weather.dropna(subset=['Time']).sort_values('Time', kind='stable')
+    laps = pd.DataFrame({'Lap Time Key': times.to_numpy(), 'Row': range(len(frame))})
+    laps = laps.dropna(subset=['Lap Time Key']).sort_values('Lap Time Key', kind='stable')
+    if weather.empty or laps.empty:
+        return frame.assign(**{column: None for column in WEATHER_SOURCE_COLUMNS.values()})
+
+    # a single sorted merge for every lap of the session, no per-lap lookups
+    matched = pd.merge_asof(laps, weather, left_on='Lap Time Key', right_on='Time', direction='nearest')
+    matched = matched.set_index('Row').reindex(range(len(frame)))
+    return frame.assign(**{column: matched[column].to_numpy() for column in WEATHER_SOURCE_COLUMNS.values()})
+
+def _lap_frames(race_stats, race_id, race_name, weather=False, drivers=None):
+    laps = race_stats.laps
+    if drivers is not None:
+        laps = laps[laps['DriverNumber'].astype(str).isin(drivers)]
+    numbers = laps['DriverNumber'].astype(str)
+    # laps only carry the driver abbreviation, take the driver id of the results like the dataset
+    names = numbers.map(dict(zip(race_stats.results['DriverNumber'].astype(str), race_stats.results['DriverId'])))
+    frame = _detail_frame(race_id, race_name, numbers.to_numpy(), names.to_numpy(), laps, LAP_SOURCE_COLUMNS)
+    if weather:
+        frame = _lap_weather(frame, race_stats.weather_data)
+    for start in range(0, len(frame), DETAIL_CHUNK_ROWS):
+        yield frame.iloc[start:start + DETAIL_CHUNK_ROWS]
+
+def _telemetry_frames(race_stats, race_id, race_name, drivers=None):
+    names = dict(zip(race_stats.results['DriverNumber'].astype(str), race_stats.results['DriverId']))
+    # one driver's samples at a time
+    for number, samples in race_stats.car_data.items():
+        if drivers is not None and str(number) not in drivers:
             continue
-        # weather data
-        weather_data = race_stats.weather_data
-        weather_temp_avg = weather_data['AirTemp'].mean()
-        weather_humidity_avg = weather_data['Humidity'].mean()
-        weather_pressure_avg = weather_data['Pressure'].mean()
-        weather_rain = True in weather_data['Rainfall'].values # if its raining during the race, it will be changed to 'True'
-        weather_track_temp = weather_data['TrackTemp'].mean()
-        weather_wind_speed_avg = weather_data['WindSpeed'].mean()
-
-        # race results for EACH driver
-        for idx, driver_info in race_results.iterrows():
-            race_info = {} # dictionary for everything, per driver
-
-            # set race information into race_info
-            race_info['Race Name'] = race_name
-            race_info['Race Location'] = "{},{}".format(race_loc, race_country)
-            race_info['Race Date'] = race_date
-            race_info['Race Format'] = race_format
-
-            # add race start timestamp
-            race_info['Race Start Time'] = race_ts
-
-            # set weather information
-            race_info['Air Temperature'] = weather_temp_avg
-            race_info['Relative Humidity'] = weather_humidity_avg
-            race_info['Air Pressure'] = weather_pressure_avg
-            race_info['Rainfall'] = weather_rain
-            race_info['Track Temperature'] = weather_track_temp
-            race_info['Wind Speed'] = weather_wind_speed_avg
-
-            # add results and per driver info
-            driver_number = driver_info['DriverNumber']
-            driver_name = driver_info['DriverId']
-            driver_team = driver_info['TeamName']
-            #driver_nationality = driver_info['CountryCode'] # dropping country attribute
-            driver_race_pos = driver_info['Position']
-            driver_race_time = driver_info['Time']
-            driver_race_points = driver_info['Points']
-            driver_grid_pos = driver_info['GridPosition']
-
-            race_info['Driver ID'] = driver_number
-            race_info['Driver Name'] = driver_name
-            race_info['Driver Number and Race Name'] = "{} : {}".format(driver_number, race_name)
-            race_info['Driver Team'] = driver_team
-            #race_info['Driver Country'] = driver_nationality
-            race_info['Position'] = driver_race_pos
-            race_info['Race Time'] = driver_race_time
-            race_info['Race Point'] = driver_race_points
-            race_info['Race Grid Position'] = driver_grid_pos # what number they were at when starting
-            print("processing racer {} for {}".format(driver_name, race_name))
-
-            # Add final race_info data into output_data
-            output_data.append(race_info)
-            # if rows EXISTS (is not None) and matches number of rows, exit.
-            if rows and len(output_data) == rows:
-                _write_csv(output_data, filename)
-                return # EXIT IF the function reaches the specific number of rows
-
-    _write_csv(output_data, filename) # write data to csv after all races
-
-# creating csv file
-def _write_csv(output_data, filename):
-    fieldnames = output_data[0].keys()
-    # Open the file in write mode
-    with open(filename, mode='w', newline='') as file:
-        # Create a DictWriter object
-        writer = csv.DictWriter(file, fieldnames=fieldnames)
-        # Write the header
-        writer.writeheader()
-        # Write the rows
-        writer.writerows(output_data)
-
-# entry point
-if __name__ == '__main__':
+        frame = _detail_frame(race_id, race_name, str(number), names.get(str(number)), samples, TELEMETRY_SOURCE_COLUMNS)
+        for start in range(0, len(frame), DETAIL_CHUNK_ROWS):
+            yield frame.iloc[start:start + DETAIL_CHUNK_ROWS]
+
+# returns the number of bytes written. drivers are the driver numbers to write, all when None
+def _write_details(filename, kind, key, race_name, race_stats, lap_weather=False, drivers=None):
+    path = _detail_path(filename, kind, key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    sink = ParquetSink(path) if dataset.is_parquet(path) else CsvSink(path, date_format=DETAIL_DATE_FORMAT)
+    try:
+        if kind == 'laps':
+            frames = _lap_frames(race_stats, _race_id(key), race_name, weather=lap_weather, drivers=drivers)
+        else:
+            frames = _telemetry_frames(race_stats, _race_id(key), race_name, drivers=drivers)
+        for frame in frames:
+            sink.write(frame)
+    except BaseException:
+        sink.abort()
+        raise
+    sink.close()
+    return sink.bytes
+
+# load the race session for a single event
+def _load_session(race_event, laps=False, telemetry=False, metrics=None):
+    race_stats = race_event.get_race()
+    # fastf1 needs the laps to load telemetry
+    with metrics.stage('load', event=race_event['OfficialEventName']) if metrics else nullcontext():
+        race_stats.load(laps=laps or telemetry, telemetry=telemetry, messages=False)
+    return race_stats
+
+def load_sessions(race_events, workers=1, loader=_load_session):
+    """Load the race session of each event and yield (race_event, race_stats, error)
+    tuples in the same order as race_events.
+
+    With more than one worker the sessions are loaded on a thread pool (loading is
+    almost all waiting on the network/cache), keeping at most 2 * workers loads
+    queued so memory stays bounded. A failed load is yielded with its exception
+    instead of being raised."""
+    if workers <= 1:
+        for race_event in race_events:
+            try:
+                yield race_event, loader(race_event), None
+            except Exception as err:
+                yield race_event, None, err
+        return
+
+    pool = ThreadPoolExecutor(max_workers=workers)
+    pending = deque()
+    try:
+        for race_event in race_events:
+            pending.append((race_event, pool.submit(loader, race_event)))
+            if len(pending) >= 2 * workers:
+                yield _session_result(*pending.popleft())
+        while pending:
+            yield _session_result(*pending.popleft())
+    finally:
+        # drop loads that have not started yet if the caller stopped early (--rows)
+        pool.shutdown(wait=True, cancel_futures=True)
+
+def _session_result(race_event, future):
+    try:
+        return race_event, future.result(), None
+    except Exception as err:
+        return race_event, None, err
+
+# print a summary of the events we could not load
+def _report_failures(failed_events, attempts=None):
+    if not failed_events:
+        return
+    print("{} event(s) failed to load:".format(len(failed_events)))
+    for race_name, error in failed_events:
+        tries = (attempts or {}).get(race_name, 1)
+        after = " (after {} attempts)".format(tries) if tries > 1 else ""
+        print("  {}: {}{}".format(race_name, error, after))
+
+class ParquetSink:
+    """Writes race frames to a parquet file with typed columns.
+
+    Same interface as CsvSink. Races are buffered until ROW_GROUP_ROWS rows are
+    waiting and then written as one row group, so memory stays bounded. The file
+    is written to filename + '.part' and renamed over filename by close()."""
+
+    ROW_GROUP_ROWS = 50000
+
+    def __init__(self, filename):
+        try:
+            import pyarrow.parquet
+        except ImportError:
+            raise SystemExit("Writing parquet needs pyarrow: pip or pip3 install pyarrow")
+        self._parquet = pyarrow.parquet
+        self.filename = filename
+        self.rows = 0
+        self._path = filename + '.part'
+        self.bytes = 0
+        self._writer = None
+        self._schema = None
+        self._pending = []
+        self._pending_rows = 0
+
+    def write(self, race_frame, race_id=None):
+        if race_frame is None or race_frame.empty:
+            return
+        # checkpoint files come back as text, give every column its real type
+        self._pending.append(dataset.typed(race_frame))
+        self._pending_rows += len(race_frame)
+        self.rows += len(race_frame)
+        if self._pending_rows >= self.ROW_GROUP_ROWS:
+            self._flush()
+
+    def _flush(self):
+        if not self._pending:
+            return
+        import pyarrow as pa
+
+        frame = pd.concat(self._pending, ignore_index=True)
+        if self._writer is None:
+            self._schema = dataset.arrow_schema(frame.columns)
+            self._writer = self._parquet.ParquetWriter(self._path, self._schema)
+        table = pa.Table.from_pandas(frame[self._schema.names], schema=self._schema, preserve_index=False)
+        self._writer.write_table(table)
+        self._pending = []
+        self._pending_rows = 0
+
+    def close(self):
+        self._flush()
+        if self._writer is None:
+            return
+        self._writer.close()
+        self.bytes = os.path.getsize(self._path)
+        os.replace(self._path, self.filename)
+
+    def abort(self):
+        # write what we still have so the rows collected so far survive
+        self._flush()
+        if self._writer is not None:
+            self._writer.close()
+            print("Stopped early, {} rows kept in {}".format(self.rows, self._path))
+
+class TableSink:
+    """Writes a races table (one row per race, with its weather) and a results table
+    (one row per driver per race) instead of one flat file, see dataset.read_tables.
+
+    The race information and weather are stored once per race instead of on
+    every driver row. Both tables carry 'Race ID' (season * 100 + round)."""
+
+    def __init__(self, filename, append=False):
+        self.filename = filename
+        self._races = _open_sink(dataset.table_path(filename, 'races'), append=append)
+        self._results = _open_sink(dataset.table_path(filename, 'results'), append=append)
+
+    @property
+    def rows(self):
+        return self._results.rows
+
+    @property
+    def bytes(self):
+        return self._races.bytes + self._results.bytes
+
+    def write(self, race_frame, race_id=None):
+        if race_frame is None or race_frame.empty:
+            return
+        race_frame = race_frame.assign(**{dataset.RACE_KEY: race_id})
+        self._races.write(race_frame.iloc[:1][[dataset.RACE_KEY] + dataset.race_columns(race_frame.columns)])
+        self._results.write(race_frame[[dataset.RACE_KEY] + dataset.RESULT_COLUMNS])
+
+    def close(self):
+        self._races.close()
+        self._results.close()
+
+    def abort(self):
+        self._races.abort()
+        self._results.abort()
+
+# refuses a path that exists but is not a partitioned dataset (or an empty directory)
+def _check_partition_dir(directory):
+    empty = os.path.isdir(directory) and not os.listdir(directory)
+    if os.path.exists(directory) and not empty and not dataset.is_partitioned(directory):
+        raise ValueError("{} exists and is not a partitioned dataset, it is not replaced".format(directory))
+
+class PartitionSink:
+    """Writes every race to its own file in a directory partitioned by season and
+    round (e.g. f1/season=2023/round=05/part.csv for f1.csv), plus an index of the
+    partitions with their race, date, rows, drivers and teams, see dataset.read_partitioned.
+
+    A new dataset is written to the directory + '.part' and renamed over the
+    directory by close(). With append=True the races are added to the existing
+    directory and a race that is written again replaces its partition. The index
+    is only rewritten by close(), so readers never see a half written partition."""
+
+    def __init__(self, filename, append=False):
+        self.filename = filename
+        self.directory = dataset.partition_dir(filename)
+        self.rows = 0
+        self.bytes = 0
+        self._ext = '.parquet' if dataset.is_parquet(filename) else '.csv'
+        # only a partitioned dataset is ever replaced, never some other directory of the same name
+        _check_partition_dir(self.directory)
+        if append and dataset.is_partitioned(self.directory):
+            self._path = self.directory
+            partitions = dataset.read_partition_index(self.directory)['partitions']
+        else:
+            self._path = self.directory + '.part'
+            shutil.rmtree(self._path, ignore_errors=True)
+            partitions = []
+        self._partitions = {partition['race_id']: partition for partition in partitions}
+
+    def write(self, race_frame, race_id=None):
+        if race_frame is None or race_frame.empty:
+            return
+        season, round_number = divmod(race_id, 100)
+        name = dataset.partition_file(season, round_number, self._ext)
+        path = os.path.join(self._path, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        part = ParquetSink(path) if self._ext == '.parquet' else CsvSink(path)
+        part.write(race_frame)
+        part.close()
+        self.rows += len(race_frame)
+        self.bytes += part.bytes
+        self._partitions[race_id] = {
+            'race_id': race_id,
+            'season': season,
+            'round': round_number,
+            'race': str(race_frame['Race Name'].iloc[0]),
+            'date': str(pd.Timestamp(race_frame['Race Date'].iloc[0])),
+            'file': name,
+            'rows': len(race_frame),
+            'bytes': part.bytes,
+            'drivers': sorted(race_frame['Driver Name'].astype(str).unique().tolist()),
+            'teams': sorted(race_frame['Driver Team'].astype(str).unique().tolist()),
+        }
+
+    def _write_index(self):
+        index = {'partitions': [self._partitions[race_id] for race_id in sorted(self._partitions)]}
+        path = os.path.join(self._path, dataset.PARTITION_INDEX)
+        with open(path + '.tmp', mode='w') as file:
+            json.dump(index, file, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def close(self):
+        if self._path == self.directory:
+            if self.rows:
+                self._write_index()
+            return
+        if not self.rows:
+            shutil.rmtree(self._path, ignore_errors=True)
+            return
+        self._write_index()
+        _check_partition_dir(self.directory)
+        if dataset.is_partitioned(self.directory):
+            shutil.rmtree(self.directory)
+        os.replace(self._path, self.directory)
+
+    def abort(self):
+        # index the races written so far so they can still be read
+        if self.rows:
+            self._write_index()
+            if self._path != self.directory:
+                print("Stopped early, {} rows kept in {}".format(self.rows, self._path))
+
+def _open_sink(filename, append=False, layout='flat'):
+    if layout == 'tables':
+        return TableSink(filename, append=append)
+    if layout == 'partitioned':
+        return PartitionSink(filename, append=append)
+    if dataset.is_parquet(filename):
+        return ParquetSink(filename)
+    return CsvSink(filename, append=append)
+
+# file that holds the race dates of a dataset, used to find where --append starts
+def _dates_file(filename, layout='flat'):
+    if layout == 'tables':
+        return dataset.table_path(filename, 'races')
+    return filename
+
+# latest race date of the dataset in any layout, None if there is no data yet
+def _last_race_date(filename, layout='flat'):
+    if layout == 'partitioned':
+        directory = dataset.partition_dir(filename)
+        if not dataset.is_partitioned(directory):
+            return None
+        dates = [pd.Timestamp(p['date']) for p in dataset.read_partition_index(directory)['partitions']]
+        return max(dates) if dates else None
+    return last_race_date(_dates_file(filename, layout))
+
+# whether the dataset already holds data, which a fresh run would replace
+def _has_dataset(filename, layout='flat'):
+    if layout == 'partitioned':
+        return dataset.is_partitioned(dataset.partition_dir(filename))
+    return os.path.exists(_dates_file(filename, layout))
+
+# checkpoint handling
+# A checkpoint is a directory with one csv per extracted race plus a manifest.json
+# that records, for every (season, round), the race name, row count, sha256 of its
+# csv, the weather statistics it was built with and the driver and team filters
+# of its lap and telemetry files (and whether the laps have their weather). Races listed in the manifest with the same
+# statistics, and files, are never loaded again.
+MANIFEST_NAME = 'manifest.json'
+
+def _event_key(season, race_event):
+    return "{}:{}".format(season, int(race_event['RoundNumber']))
+
+# 'Race ID' of an event key, e.g. 202305 for round 5 of 2023
+def _race_id(key):
+    season, round_number = key.split(':')
+    return int(season) * 100 + int(round_number)
+
+def _checkpoint_filename(key):
+    season, round_number = key.split(':')
+    return "{}_{:02d}.csv".format(season, int(round_number))
+
+def _read_manifest(checkpoint):
+    os.makedirs(checkpoint, exist_ok=True)
+    path = os.path.join(checkpoint, MANIFEST_NAME)
+    if not os.path.exists(path):
+        return {'events': {}}
+    with open(path) as file:
+        return json.load(file)
+
+def _save_manifest(checkpoint, manifest):
+    # write to a temp file first so a crash never leaves a half written manifest
+    path = os.path.join(checkpoint, MANIFEST_NAME)
+    with open(path + '.tmp', mode='w') as file:
+        json.dump(manifest, file, indent=2, sort_keys=True)
+    os.replace(path + '.tmp', path)
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, mode='rb') as file:
+        for block in iter(lambda: file.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+# a race only counts as done if its csv is still there and unchanged
+def _is_checkpointed(checkpoint, manifest, key, weather_stats=()):
+    entry = manifest['events'].get(key)
+    if entry is None:
+        return False
+    # a race extracted with other weather statistics has other columns, it is extracted again
+    if entry.get('weather_stats', []) != list(weather_stats):
+        return False
+    path = os.path.join(checkpoint, entry['file'])
+    return os.path.exists(path) and _file_hash(path) == entry['sha256']
+
+# what a lap or telemetry file of a race was written with, see _has_details
+def _detail_settings(kind, drivers=None, teams=None, lap_weather=False):
+    settings = {'drivers': drivers or None, 'teams': teams or None}
+    if kind == 'laps':
+        settings['weather'] = lap_weather
+    return settings
+
+# whether the lap and telemetry files of a race exist and were written with the
+# same settings, e.g. a file written for --drivers perez only holds perez and
+# lap files written without --lap-weather have no weather columns
+def _has_details(filename, manifest, key, settings):
+    written = manifest['events'][key].get('details', {})
+    return all(os.path.exists(_detail_path(filename, kind, key)) and written.get(kind) == wanted
+               for kind, wanted in settings.items())
+
+def _read_checkpoint(checkpoint, manifest, key):
+    # read every value as the exact text that was written so it is copied as is
+    path = os.path.join(checkpoint, manifest['events'][key]['file'])
+    return pd.read_csv(path, dtype=str, keep_default_na=False)
+
+def _write_checkpoint(checkpoint, manifest, key, race_event, race_frame, weather_stats=(), details=None):
+    filename = _checkpoint_filename(key)
+    path = os.path.join(checkpoint, filename)
+    part = CsvSink(path)
+    part.write(race_frame)
+    part.close()
+    manifest['events'][key] = {
+        'race': race_event['OfficialEventName'],
+        'file': filename,
+        'rows': len(race_frame),
+        'sha256': _file_hash(path),
+        'weather_stats': list(weather_stats),
+        'details': details or {},
+    }
+    _save_manifest(checkpoint, manifest)
+
+# "2018-2024" or "2019,2021,2023" to a list of seasons, "1-5,8" to a list of rounds
+def parse_seasons(text):
+    seasons = []
+    for part in text.split(','):
+        first, _, last = part.strip().partition('-')
+        seasons.extend(range(int(first), int(last or first) + 1))
+    return seasons
+
+# "monaco, Red Bull" to ['monaco', 'Red Bull']
+def parse_names(text):
+    return [name.strip() for name in text.split(',') if name.strip()]
+
+# latest 'Race Date' in an existing csv, None if there is no data yet
+def last_race_date(filename):
+    if not os.path.exists(filename):
+        return None
+    with open(filename, newline='') as file:
+        header = next(csv.reader(file), None)
+    if not header:
+        return None
+    column = header.index('Race Date')
+
+    # races are written in schedule order, so the last line holds the latest race.
+    # Only read the end of the file instead of parsing all of it.
+    with open(filename, mode='rb') as file:
+        file.seek(0, os.SEEK_END)
+        offset = max(0, file.tell() - 65536)
+        file.seek(offset)
+        lines = file.read().splitlines()
+    # the window may start inside a line, or inside a multibyte character of it
+    if offset:
+        lines = lines[1:]
+    lines = [line.decode('utf-8') for line in lines]
+    last_line = next((line for line in reversed(lines) if line.strip()), '')
+    last_row = next(csv.reader([last_line]))
+    if last_row == header:
+        return None
+    return pd.Timestamp(last_row[column])
+
+# timestamps are always written with their time, e.g. 2023-03-05 00:00:00, and lines
+# end in \r\n like the csv module writes them, so old and new rows look the same
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+class CsvSink:
+    """Writes race frames to a csv file race by race, so only one race is held in memory.
+
+    A new file is written to filename + '.part' and renamed over filename by
+    close(), so readers never see a half written file. If the run dies the
+    '.part' file keeps every race written so far. With append=True the rows
+    are added to the end of an existing file, using its column order."""
+
+    def __init__(self, filename, append=False, date_format=DATE_FORMAT):
+        self.filename = filename
+        self.rows = 0
+        self.bytes = 0
+        self.date_format = date_format
+        self._fieldnames = None
+
+        if append and os.path.exists(filename) and os.path.getsize(filename) > 0:
+            # keep the column order of the file we are appending to
+            with open(filename, newline='') as file:
+                self._fieldnames = next(csv.reader(file))
+            self._path = filename
+            self._file = open(filename, mode='a', newline='')
+        else:
+            self._path = filename + '.part'
+            self._file = open(self._path, mode='w', newline='')
+
+    def write(self, race_frame, race_id=None):
+        if race_frame is None or race_frame.empty:
+            return
+        header = self._fieldnames is None
+        if header:
+            self._fieldnames = list(race_frame.columns)
+        start = self._file.tell()
+        race_frame.reindex(columns=self._fieldnames).to_csv(
+            self._file, header=header, index=False, date_format=self.date_format, lineterminator='\r\n')
+        # make sure the race is on disk before we move on to the next one
+        self._file.flush()
+        self.rows += len(race_frame)
+        self.bytes += self._file.tell() - start
+
+    def close(self):
+        self._file.close()
+        if self._path == self.filename:
+            return
+        if self.rows:
+            os.replace(self._path, self.filename)
+        else:
+            os.remove(self._path)
+
+    def abort(self):
+        # leave the partial output where it is so the rows collected so far survive
+        self._file.close()
+        if self._path != self.filename and self.rows:
+            print("Stopped early, {} rows kept in {}".format(self.rows, self._path))
+
+# command line, also used by f1.py collect
+def main(argv=None, prog=None):
     aparser = argparse.ArgumentParser(
-        description='Generate csv file for 2023 F1 season results')
+        prog=prog,
+        description='Generate csv file for F1 season results')
 
     # filename handling, default filename will be f1_2023.csv
     aparser.add_argument(
         '--filename',
         default='weatherIncluded3.csv',
         required=False,
-        help='filename to produce')
+        help='filename to produce, a name ending in .parquet writes a typed parquet file (needs pyarrow)')
 
     # rows handling
     aparser.add_argument(
@@ -130,11 +914,252 @@ if __name__ == '__main__':
         type=int,
         required=False,
         help='only generate data for number of rows')
-    args = aparser.parse_args()
-    get_dataset(args.filename, rows=args.rows)
-    
+
+    # output layout
+    aparser.add_argument(
+        '--layout',
+        default='flat',
+        choices=['flat', 'tables', 'partitioned'],
+        help='flat: one row per driver per race in one file. tables: a races table and a results '
+             'table next to filename (e.g. f1_races.csv and f1_results.csv). partitioned: a directory '
+             'with one file per race and an index (e.g. f1/season=2023/round=05/part.csv)')
+
+    # per race progress output
+    aparser.add_argument(
+        '--progress',
+        action='store_true',
+        help='print a line for every race as it is written')
+
+    # concurrent session loading
+    aparser.add_argument(
+        '--workers',
+        default=1,
+        type=int,
+        required=False,
+        help='number of race sessions to load at the same time')
+
+    # seasons handling, default is the 2023 season
+    aparser.add_argument(
+        '--seasons',
+        default=None,
+        required=False,
+        help='seasons to collect, e.g. 2023, 2018-2024 or 2019,2021 (default 2023, '
+             'or the seasons since the last race in the file with --append/--since)')
+
+    # filters, races left out by --events/--rounds/--from/--to are never loaded
+    aparser.add_argument(
+        '--events',
+        default=None,
+        required=False,
+        help='only collect these events, parts of event names, countries or locations, e.g. monaco,silverstone')
+    aparser.add_argument(
+        '--rounds',
+        default=None,
+        required=False,
+        help='only collect these rounds of every season, e.g. 1-5 or 1,8,22')
+    aparser.add_argument(
+        '--from',
+        dest='start',
+        default=None,
+        required=False,
+        help='only collect events on or after this date (YYYY-MM-DD)')
+    aparser.add_argument(
+        '--to',
+        dest='end',
+        default=None,
+        required=False,
+        help='only collect events on or before this date (YYYY-MM-DD)')
+    aparser.add_argument(
+        '--drivers',
+        default=None,
+        required=False,
+        help='only keep these drivers, driver ids or numbers, e.g. max_verstappen,44')
+    aparser.add_argument(
+        '--teams',
+        default=None,
+        required=False,
+        help='only keep drivers of these teams, parts of team names, e.g. ferrari,"red bull"')
+
+    # incremental updates
+    aparser.add_argument(
+        '--append',
+        action='store_true',
+        help='only collect races after the last race date in the file and append them')
+    aparser.add_argument(
+        '--since',
+        default=None,
+        required=False,
+        help='only collect races after this date (YYYY-MM-DD), appended to the file when it exists')
+
+    # weather statistics
+    aparser.add_argument(
+        '--weather-stats',
+        default='',
+        required=False,
+        help='extra weather columns besides the race means, e.g. min,max,std,p10,p90,rain_fraction,first_rain')
+
+    # lap and telemetry files
+    aparser.add_argument(
+        '--laps',
+        action='store_true',
+        help='also write every lap of every race, one file per race in <filename>_laps/')
+    aparser.add_argument(
+        '--telemetry',
+        action='store_true',
+        help='also write the car telemetry of every race, one file per race in <filename>_telemetry/ '
+             '(sessions are loaded one at a time)')
+    aparser.add_argument(
+        '--lap-weather',
+        action='store_true',
+        help='add the weather sample nearest to the start of each lap to the lap files (implies --laps)')
+
+    # instrumentation
+    aparser.add_argument(
+        '--metrics-out',
+        default=None,
+        required=False,
+        help='write stage and per race timings, row counts, bytes written and peak memory to this JSON file')
+    aparser.add_argument(
+        '--profile',
+        default=None,
+        required=False,
+        help='write a cProfile dump of the run to this file (view it with python3 -m pstats FILE; '
+             'loads on --workers threads are not included)')
+
+    # load scheduling
+    aparser.add_argument(
+        '--retries',
+        default=2,
+        type=int,
+        help='times a failed race session load is tried again (default 2)')
+    aparser.add_argument(
+        '--backoff',
+        default=2.0,
+        type=float,
+        help='seconds to wait before the first retry, doubled for every next one (default 2)')
+    aparser.add_argument(
+        '--rate',
+        default=None,
+        type=float,
+        help='most race session loads started per second, over all workers (default no limit)')
+    aparser.add_argument(
+        '--timeout',
+        default=None,
+        type=float,
+        help='seconds after which a race session load counts as failed (default no limit)')
+
+    # resumable runs
+    aparser.add_argument(
+        '--checkpoint',
+        default=None,
+        required=False,
+        help='directory that keeps already extracted races so reruns skip them')
+    args = aparser.parse_args(argv)
+    if args.workers < 1:
+        aparser.error('--workers must be at least 1')
+    if args.retries < 0:
+        aparser.error('--retries must be 0 or more')
+    if args.layout == 'partitioned':
+        try:
+            _check_partition_dir(dataset.partition_dir(args.filename))
+        except ValueError as err:
+            aparser.error(str(err))
+    if args.append and dataset.is_parquet(args.filename) and args.layout != 'partitioned':
+        aparser.error('--append only works with csv files or --layout partitioned')
+    since = None
+    if args.since:
+        try:
+            since = pd.Timestamp(args.since)
+        except ValueError:
+            aparser.error('--since must be a date like 2023-07-01')
+    elif args.append:
+        since = _last_race_date(args.filename, args.layout)
+    # --since adds to an existing dataset, it never replaces it with only the newer races
+    append = args.append or (since is not None and _has_dataset(args.filename, args.layout))
+    if append and dataset.is_parquet(args.filename) and args.layout != 'partitioned':
+        aparser.error('{} already exists and --since would append to it, which only works with csv files '
+                      'or --layout partitioned'.format(args.filename))
+    if append and not args.append:
+        # races already in the dataset are not appended a second time
+        last = _last_race_date(args.filename, args.layout)
+        if last is not None and last > since:
+            since = last
+
+    try:
+        weather_stats = parse_weather_stats(args.weather_stats)
+    except ValueError as err:
+        aparser.error('unknown weather statistic {}, use {} or pNN'.format(err, ','.join(WEATHER_STATS)))
+
+    start, end = None, None
+    try:
+        start = pd.Timestamp(args.start) if args.start else None
+        end = pd.Timestamp(args.end) if args.end else None
+    except ValueError:
+        aparser.error('--from and --to must be dates like 2023-07-01')
+    rounds = None
+    if args.rounds:
+        try:
+            rounds = parse_seasons(args.rounds)
+        except ValueError:
+            aparser.error('--rounds must look like 5, 1-5 or 1,8,22')
+
+    if args.seasons:
+        try:
+            seasons = parse_seasons(args.seasons)
+        except ValueError:
+            aparser.error('--seasons must look like 2023, 2018-2024 or 2019,2021')
+    elif since is not None or start is not None:
+        # nothing before the cutoff is needed, so start at its season
+        first = max(date for date in (since, start) if date is not None)
+        last = end.year if end is not None else pd.Timestamp.now().year
+        seasons = list(range(first.year, last + 1))
+    else:
+        seasons = [2023]
+    metrics = Metrics(filename=args.filename, seasons=seasons, workers=args.workers, layout=args.layout,
+                      since=since, append=append, laps=args.laps, telemetry=args.telemetry,
+                      events=args.events, rounds=rounds, start=start, end=end, drivers=args.drivers, teams=args.teams)
+    profiler = None
+    if args.profile:
+        import cProfile
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        get_dataset(args.filename, rows=args.rows, workers=args.workers, seasons=seasons,
+                    checkpoint=args.checkpoint, since=since, append=append, progress=args.progress,
+                    layout=args.layout, laps=args.laps, telemetry=args.telemetry, lap_weather=args.lap_weather,
+                    weather_stats=weather_stats, metrics=metrics, retries=args.retries, backoff=args.backoff,
+                    rate=args.rate, timeout=args.timeout, events=args.events and parse_names(args.events),
+                    rounds=rounds, start=start, end=end, drivers=args.drivers and parse_names(args.drivers),
+                    teams=args.teams and parse_names(args.teams))
+    finally:
+        # also written for a failed or interrupted run, it shows how far it got
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(args.profile)
+            print("Wrote profile to {}".format(args.profile))
+        if args.metrics_out:
+            metrics.write(args.metrics_out)
+            print("Wrote metrics to {}".format(args.metrics_out))
+
+
+if __name__ == '__main__':
+    main()
+
 # How to run the program
 
 # pip or pip3 install pandas
 # pip or pip3 install fastf1  
 # python3 data_collect.py --filename yourfilename.csv --rows 10(or any number) (Also can be executed without filename or rows too)
+# python3 datamining.py --workers 4 (load 4 race sessions at a time, see benchmark_loading.py)
+# python3 datamining.py --seasons 2018-2024 --checkpoint f1_checkpoint (rerunning only fetches missing races)
+# python3 datamining.py --filename yourfilename.csv --append (nightly update, only fetches races newer than the file)
+# python3 datamining.py --filename f1.parquet (typed columnar output, pip or pip3 install pyarrow)
+# python3 datamining.py --filename f1.csv --layout tables (writes f1_races.csv and f1_results.csv)
+# python3 datamining.py --filename f1.csv --seasons 2014-2024 --layout partitioned (writes f1/season=2023/round=05/part.csv, ... and f1/_index.json)
+# python3 datamining.py --filename f1.csv --laps --telemetry (also writes f1_laps/2023_01.csv, ... and f1_telemetry/2023_01.csv, ...)
+# python3 datamining.py --filename f1.csv --lap-weather (lap files with the weather at the start of every lap)
+# python3 datamining.py --weather-stats min,max,std,p90,rain_fraction,first_rain (more weather columns per race)
+# python3 datamining.py --metrics-out metrics.json --profile collect.prof (where the time goes, per stage and race)
+# python3 datamining.py --seasons 2018-2024 --workers 4 --retries 3 --rate 2 --timeout 120 (long runs survive flaky loads)
+# python3 datamining.py --seasons 2019-2023 --teams ferrari --rounds 1-10 (only loads the races it needs)
+# python3 f1.py collect ... (same options, through the project command line)
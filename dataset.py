@@ -0,0 +1,560 @@
+# Loading code for the race dataset written by datamining.py
+#
+# The dataset can be stored as csv (everything is text) or as parquet (typed
+# columns). read_dataset gives back the same column types for both, so the
+# visualizations do not need to care which one they are reading. It can also be
+# stored as a races table and a results table, see read_tables/join_results, or
+# as a directory with one file per race, see read_partitioned.
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+# columns of the flat dataset, in file order
+COLUMNS = ['Race Name', 'Race Location', 'Race Date', 'Race Format', 'Race Start Time',
+           'Air Temperature', 'Relative Humidity', 'Air Pressure', 'Rainfall', 'Track Temperature', 'Wind Speed',
+           'Race Date Ms', 'Race Start Time Ms',
+           'Driver ID', 'Driver Name', 'Driver Number and Race Name', 'Driver Team',
+           'Position', 'Race Time', 'Race Point', 'Race Grid Position', 'Race Time Ms', 'Gap To Winner Ms']
+
+# The times of a race as whole milliseconds (int64, <NA> where unknown), so time
+# arithmetic is plain integer math instead of parsing text on every load:
+#   'Race Date Ms', 'Race Start Time Ms'  the dates as ms since 1970-01-01 (the naive times taken as UTC)
+#   'Race Time Ms'                        elapsed race time of the driver, the winner's time plus the gap
+#   'Gap To Winner Ms'                    gap to the winner, 0 for the winner
+# 'Race Time' itself holds fastf1's mix of the winner's time and everybody else's gap.
+# Files written before these columns existed get them decoded by read_dataset.
+MS_SOURCES = {
+    'Race Date Ms': ['Race Date'],
+    'Race Start Time Ms': ['Race Start Time'],
+    'Race Time Ms': ['Race Time', 'Position'],
+    'Gap To Winner Ms': ['Race Time', 'Position'],
+}
+
+# The same data can be stored as two tables: one row per race (with its weather)
+# and one row per driver per race, linked by 'Race ID' (season * 100 + round).
+# 'Driver Number and Race Name' is not stored, join_results rebuilds it.
+RACE_KEY = 'Race ID'
+RACE_COLUMNS = COLUMNS[:13]
+RESULT_COLUMNS = ['Driver ID', 'Driver Name', 'Driver Team', 'Position', 'Race Time', 'Race Point',
+                  'Race Grid Position', 'Race Time Ms', 'Gap To Winner Ms']
+
+# Weather channels of a race. By default each one holds the mean over the race,
+# datamining.py --weather-stats adds more statistics as race level columns named
+# after the channel, e.g. 'Air Temperature Max' or 'Track Temperature P90', plus
+# 'Rainfall Fraction' (share of samples with rain) and 'First Rain Time' (session
+# time of the first sample with rain).
+WEATHER_CHANNELS = ['Air Temperature', 'Relative Humidity', 'Air Pressure', 'Track Temperature', 'Wind Speed']
+WEATHER_STAT_NAMES = {'min': 'Min', 'max': 'Max', 'std': 'Std'}
+RAIN_STAT_COLUMNS = {'rain_fraction': 'Rainfall Fraction', 'first_rain': 'First Rain Time'}
+
+# datamining.py --laps and --telemetry write one file per race with these columns,
+# one row per lap and one row per car telemetry sample, linked to the race by 'Race ID'
+# (races table) or 'Race Name' (flat dataset)
+LAP_COLUMNS = [RACE_KEY, 'Race Name', 'Driver ID', 'Driver Name', 'Lap Number', 'Lap Time', 'Lap Start Time',
+               'Lap End Time', 'Sector 1 Time', 'Sector 2 Time', 'Sector 3 Time', 'Stint', 'Compound', 'Tyre Life',
+               'Position', 'Pit In Time', 'Pit Out Time', 'Track Status']
+# with --lap-weather every lap also gets the weather sample nearest to its start
+LAP_WEATHER_COLUMNS = ['Air Temperature', 'Relative Humidity', 'Air Pressure', 'Rainfall', 'Track Temperature',
+                       'Wind Speed']
+TELEMETRY_COLUMNS = [RACE_KEY, 'Race Name', 'Driver ID', 'Driver Name', 'Sample Date', 'Session Time', 'Speed', 'RPM',
+                     'Gear', 'Throttle', 'Brake', 'DRS']
+
+# column types of the race dataset (and of the lap and telemetry files)
+CATEGORY_COLUMNS = ['Race Name', 'Race Location', 'Race Format', 'Driver ID', 'Driver Name', 'Driver Team']
+DATETIME_COLUMNS = ['Race Date', 'Race Start Time', 'Sample Date']
+DURATION_COLUMNS = ['Race Time', 'First Rain Time', 'Lap Time', 'Lap Start Time', 'Lap End Time', 'Sector 1 Time', 'Sector 2 Time',
+                    'Sector 3 Time', 'Pit In Time', 'Pit Out Time', 'Session Time']
+BOOL_COLUMNS = ['Rainfall', 'Brake']
+FLOAT_COLUMNS = ['Air Temperature', 'Relative Humidity', 'Air Pressure', 'Track Temperature', 'Wind Speed',
+                 'Position', 'Race Point', 'Race Grid Position', 'Lap Number', 'Stint', 'Tyre Life', 'Speed', 'RPM',
+                 'Throttle', 'Rainfall Fraction']
+STRING_COLUMNS = ['Driver Number and Race Name', 'Compound', 'Track Status']
+INT_COLUMNS = [RACE_KEY, 'Gear', 'DRS']
+MS_COLUMNS = list(MS_SOURCES)
+
+
+def is_parquet(path):
+    return str(path).endswith('.parquet')
+
+
+def weather_stat_column(channel, stat):
+    "Column of a weather statistic, e.g. ('Wind Speed', 'p90') -> 'Wind Speed P90'. The mean is the channel itself."
+    if stat == 'mean':
+        return channel
+    return "{} {}".format(channel, WEATHER_STAT_NAMES.get(stat, stat.upper()))
+
+
+def is_weather_stat(column):
+    "True for the extra weather statistic columns, e.g. 'Air Temperature Max' or 'Rainfall Fraction'."
+    if column in RAIN_STAT_COLUMNS.values():
+        return True
+    channel, _, stat = column.rpartition(' ')
+    if channel not in WEATHER_CHANNELS:
+        return False
+    return stat in WEATHER_STAT_NAMES.values() or re.fullmatch(r'P\d+', stat) is not None
+
+
+def race_columns(columns):
+    "The race level columns among columns (race information, weather and weather statistics), in file order."
+    return [c for c in RACE_COLUMNS if c in columns] + [c for c in columns if is_weather_stat(c)]
+
+
+def flat_order(columns):
+    "columns in the order of the flat dataset: race level columns first, then the results."
+    return race_columns(columns) + [c for c in COLUMNS[len(RACE_COLUMNS):] if c in columns]
+
+
+def typed(df):
+    "Converts the text columns of a csv (or checkpoint) frame to their real types."
+
+    df = df.copy()
+    for column in df.columns:
+        if column in CATEGORY_COLUMNS:
+            df[column] = df[column].astype(str).astype('category')
+        elif column in DATETIME_COLUMNS:
+            df[column] = pd.to_datetime(df[column])
+        elif column in DURATION_COLUMNS:
+            df[column] = pd.to_timedelta(df[column].replace('', None))
+        elif column in BOOL_COLUMNS and df[column].dtype != bool:
+            df[column] = df[column].astype(str).str.lower().eq('true')
+        elif column in FLOAT_COLUMNS or is_weather_stat(column):
+            df[column] = pd.to_numeric(df[column].replace('', None)).astype(float)
+        elif column in INT_COLUMNS:
+            df[column] = df[column].astype('int64')
+        elif column in MS_COLUMNS:
+            df[column] = pd.to_numeric(df[column].replace('', None)).astype('Int64')
+    return df
+
+
+def _ms(nanoseconds, missing):
+    # int64 nanoseconds to whole milliseconds, <NA> where missing
+    return pd.arrays.IntegerArray(nanoseconds // 1000000, missing)
+
+
+def timestamp_ms(values):
+    "Timestamps (or their text) as int64 ms since 1970-01-01, the naive times taken as UTC."
+    stamps = pd.to_datetime(pd.Series(values).replace('', None)).to_numpy('datetime64[ns]')
+    return _ms(stamps.view('int64'), np.isnat(stamps))
+
+
+def duration_ms(values):
+    "Durations (or their text, e.g. '0 days 00:00:11.987000') as int64 ms."
+    durations = pd.to_timedelta(pd.Series(values).replace('', None)).to_numpy('timedelta64[ns]')
+    return _ms(durations.view('int64'), np.isnat(durations))
+
+
+def race_time_ms(race_time, position, race):
+    """('Race Time Ms', 'Gap To Winner Ms') of every row, from 'Race Time',
+    'Position' (typed or text) and the race of every row (its name or 'Race ID'),
+    for any number of races.
+
+    fastf1 gives the winner's race time and everybody else's gap to the winner.
+    The winner's time is spread over its race with one groupby, so drivers
+    without a time (lapped or retired) and races without a winner stay <NA>."""
+
+    times = duration_ms(race_time)
+    winner = pd.to_numeric(pd.Series(position).replace('', None)).to_numpy(dtype=float) == 1
+    race_codes = pd.factorize(pd.Series(race).astype(str))[0]
+    winner_time = pd.Series(times).where(winner).groupby(race_codes).transform('max').array
+    gap = pd.Series(times).where(~winner, 0).array
+    return winner_time + gap, gap
+
+
+def _ms_sources(column, columns):
+    # columns a millisecond column is decoded from, None if columns do not have them all.
+    # Race times also need the race of every row, a results table only has its 'Race ID'
+    sources = list(MS_SOURCES[column])
+    if column in ('Race Time Ms', 'Gap To Winner Ms'):
+        sources.append(RACE_KEY if RACE_KEY in columns else 'Race Name')
+    return sources if all(source in columns for source in sources) else None
+
+
+def ms_columns(frame, wanted=MS_COLUMNS):
+    "The wanted millisecond columns (see MS_SOURCES) decoded from the columns of frame, as a dict."
+
+    columns = {}
+    wanted = [column for column in wanted if _ms_sources(column, frame.columns)]
+    for column in wanted:
+        if column == 'Race Date Ms':
+            columns[column] = timestamp_ms(frame['Race Date'])
+        elif column == 'Race Start Time Ms':
+            columns[column] = timestamp_ms(frame['Race Start Time'])
+    if 'Race Time Ms' in wanted or 'Gap To Winner Ms' in wanted:
+        race = frame[RACE_KEY] if RACE_KEY in frame.columns else frame['Race Name']
+        elapsed, gap = race_time_ms(frame['Race Time'], frame['Position'], race)
+        columns.update((column, values) for column, values in
+                       (('Race Time Ms', elapsed), ('Gap To Winner Ms', gap)) if column in wanted)
+    return columns
+
+
+def arrow_schema(columns):
+    "Returns the pyarrow schema used to write the given dataset columns to parquet."
+
+    import pyarrow as pa
+
+    fields = []
+    for column in columns:
+        if column in CATEGORY_COLUMNS:
+            # driver, team and race names repeat on every row, store them dictionary encoded
+            kind = pa.dictionary(pa.int32(), pa.string())
+        elif column in DATETIME_COLUMNS:
+            kind = pa.timestamp('ns')
+        elif column in DURATION_COLUMNS:
+            kind = pa.duration('ns')
+        elif column in BOOL_COLUMNS:
+            kind = pa.bool_()
+        elif column in FLOAT_COLUMNS or is_weather_stat(column):
+            kind = pa.float64()
+        elif column in INT_COLUMNS or column in MS_COLUMNS:
+            kind = pa.int64()
+        else:
+            kind = pa.string()
+        fields.append(pa.field(column, kind))
+    return pa.schema(fields)
+
+
+def read_dataset(path, columns=None):
+    """Reads the race dataset from a csv or parquet file (or a partitioned
+    directory) with typed columns.
+
+    Only the given columns are read, for parquet the other columns are never
+    touched on disk. Millisecond columns (see MS_SOURCES) the file does not
+    have yet are decoded from the columns they come from."""
+
+    if is_partitioned(path):
+        return read_partitioned(path, columns)
+    if is_parquet(path):
+        import pyarrow.parquet
+        stored = pyarrow.parquet.read_schema(path).names
+    else:
+        stored = list(pd.read_csv(path, nrows=0).columns)
+    derived = [c for c in MS_COLUMNS if c not in stored and (columns is None or c in columns)
+               and _ms_sources(c, stored)]
+    read = columns
+    if columns is not None:
+        read = list(dict.fromkeys([c for c in columns if c not in derived] +
+                                  [source for c in derived for source in _ms_sources(c, stored)]))
+
+    if is_parquet(path):
+        frame = pd.read_parquet(path, columns=read)
+        # pyarrow gives integer columns with nulls back as float
+        frame = frame.astype({c: 'Int64' for c in MS_COLUMNS if c in frame.columns})
+    else:
+        frame = typed(pd.read_csv(path, usecols=read))
+    if derived:
+        frame = frame.assign(**ms_columns(frame, derived))
+        if columns is not None:
+            frame = frame[[c for c in frame.columns if c in columns]]
+    return frame
+
+
+def table_path(path, table):
+    "Path of the races or results table stored next to a dataset file, e.g. f1_races.csv for f1.csv"
+
+    stem, ext = os.path.splitext(path)
+    return "{}_{}{}".format(stem, table, ext)
+
+
+def split_races(df):
+    """Splits a flat dataset into (races, results) tables.
+
+    Races are numbered by date inside each season, which matches the round
+    numbers as long as no round is missing from the data."""
+
+    races = df.drop_duplicates('Race Name')[race_columns(df.columns)]
+    races = races.sort_values('Race Date', kind='stable').reset_index(drop=True)
+    season = races['Race Date'].dt.year
+    races.insert(0, RACE_KEY, season * 100 + races.groupby(season).cumcount() + 1)
+
+    race_ids = races.set_index('Race Name')[RACE_KEY]
+    results = df[[c for c in RESULT_COLUMNS if c in df.columns]].reset_index(drop=True)
+    results.insert(0, RACE_KEY, df['Race Name'].map(race_ids).astype('int64').to_numpy())
+    return races, results
+
+
+def read_tables(path, columns=None):
+    """Reads the (races, results) tables of a dataset.
+
+    Uses the races/results files written by datamining.py --layout tables when
+    they exist, otherwise splits the flat file at path. columns are flat dataset
+    column names, each table only reads the ones it holds."""
+
+    wanted_races = result_columns = None
+    if columns is not None:
+        wanted_races = [RACE_KEY, 'Race Name'] + [c for c in race_columns(columns) if c != 'Race Name']
+        result_columns = [RACE_KEY] + [c for c in RESULT_COLUMNS if c in columns]
+        if 'Driver Number and Race Name' in columns and 'Driver ID' not in result_columns:
+            result_columns.append('Driver ID')
+
+    races_path = table_path(path, 'races')
+    results_path = table_path(path, 'results')
+    if os.path.exists(races_path) and os.path.exists(results_path):
+        return read_dataset(races_path, wanted_races), read_dataset(results_path, result_columns)
+
+    flat_columns = None
+    if columns is not None:
+        flat_columns = list(dict.fromkeys(c for c in wanted_races + result_columns + ['Race Date'] if c != RACE_KEY))
+    races, results = split_races(read_dataset(path, flat_columns))
+    if wanted_races is not None:
+        races = races[wanted_races]
+    return races, results
+
+
+# A partitioned dataset (datamining.py --layout partitioned) is a directory with
+# one file per race, e.g. f1/season=2023/round=05/part.csv for f1.csv, and an
+# index listing every partition with its race, date, row count, drivers and
+# teams, so readers can skip the partitions they do not need without opening them.
+PARTITION_INDEX = '_index.json'
+
+
+def partition_dir(path):
+    "Directory of the partitioned dataset of a dataset file name, e.g. f1 for f1.csv"
+    return os.path.splitext(path)[0]
+
+
+def partition_file(season, round_number, ext='.csv'):
+    "File of one race inside a partitioned dataset, relative to its directory."
+    return os.path.join('season={}'.format(season), 'round={:02d}'.format(round_number), 'part' + ext)
+
+
+def is_partitioned(path):
+    return os.path.isfile(os.path.join(path, PARTITION_INDEX))
+
+
+def read_partition_index(path):
+    with open(os.path.join(path, PARTITION_INDEX)) as file:
+        return json.load(file)
+
+
+def prune_partitions(index, seasons=None, rounds=None, start=None, end=None, drivers=None, teams=None):
+    """The partitions of a partition index that can hold rows matching the filters:
+    seasons and rounds are lists of numbers, start and end inclusive race dates,
+    drivers and teams lists of driver and team names."""
+
+    start = pd.Timestamp(start) if start is not None else None
+    end = pd.Timestamp(end) if end is not None else None
+    drivers = set(drivers) if drivers else None
+    teams = set(teams) if teams else None
+    kept = []
+    for partition in index['partitions']:
+        date = pd.Timestamp(partition['date'])
+        if seasons and partition['season'] not in seasons:
+            continue
+        if rounds and partition['round'] not in rounds:
+            continue
+        if (start is not None and date < start) or (end is not None and date > end):
+            continue
+        if drivers and drivers.isdisjoint(partition['drivers']):
+            continue
+        if teams and teams.isdisjoint(partition['teams']):
+            continue
+        kept.append(partition)
+    return kept
+
+
+def read_partitioned(path, columns=None, workers=4, **filters):
+    """Reads a partitioned dataset directory as one flat frame, in race order.
+
+    Partitions ruled out by the filters (see prune_partitions) are never opened,
+    the others are read on `workers` threads. Rows of other drivers and teams in
+    the partitions that are read are dropped, so the result only holds rows
+    matching every filter."""
+
+    partitions = prune_partitions(read_partition_index(path), **filters)
+    drivers, teams = filters.get('drivers'), filters.get('teams')
+    wanted = columns
+    if columns is not None:
+        # the driver and team columns are needed to drop the other drivers' rows
+        wanted = list(dict.fromkeys(list(columns) + (['Driver Name'] if drivers else []) +
+                                    (['Driver Team'] if teams else [])))
+
+    files = [os.path.join(path, partition['file']) for partition in partitions]
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        frames = list(pool.map(lambda file: read_dataset(file, wanted), files))
+    if not frames:
+        return typed(pd.DataFrame(columns=COLUMNS if columns is None else list(columns), dtype=str))
+
+    frame = pd.concat(frames, ignore_index=True)
+    # every file has its own categories, which concat turns back into plain values
+    for column in CATEGORY_COLUMNS:
+        if column in frame.columns and frame[column].dtype != 'category':
+            frame[column] = frame[column].astype(str).astype('category')
+    mask = np.ones(len(frame), dtype=bool)
+    if drivers:
+        mask &= frame['Driver Name'].astype(str).isin(list(drivers)).to_numpy()
+    if teams:
+        mask &= frame['Driver Team'].astype(str).isin(list(teams)).to_numpy()
+    if not mask.all():
+        frame = frame[mask].reset_index(drop=True)
+    return frame if columns is None else frame[list(columns)]
+
+
+def join_results(races, results, columns=None):
+    """Joins the race columns onto every result row and returns a flat dataset.
+
+    The join is a single indexed lookup on 'Race ID'. Only the given columns
+    are returned (all of them by default), in the usual file order."""
+
+    races = races.set_index(RACE_KEY)
+    label = columns is None or 'Driver Number and Race Name' in columns
+    joined = [c for c in races.columns if columns is None or c in columns or (label and c == 'Race Name')]
+    flat = results.join(races[joined], on=RACE_KEY)
+    if label:
+        flat['Driver Number and Race Name'] = flat['Driver ID'].astype(str) + " : " + flat['Race Name'].astype(str)
+    wanted = flat.columns if columns is None else columns
+    return flat[flat_order([c for c in flat.columns if c in wanted])]
+
+
+class RaceDataset:
+    """A flat race dataset with driver and race indexes built once.
+
+    The row positions of every driver and every race come from a single
+    groupby(...).indices pass, so looking up one driver's results or one race's
+    weather is a dictionary lookup instead of a boolean mask over the frame.
+    The weather lookup uses the races table when given, otherwise the first row
+    of each race."""
+
+    def __init__(self, frame, races=None):
+        self.frame = frame
+        self.driver_rows = frame.groupby('Driver Name', observed=True, sort=False).indices
+        self.race_rows = {}
+        if 'Race Name' in frame.columns:
+            self.race_rows = frame.groupby('Race Name', observed=True, sort=False).indices
+        if races is None:
+            first_rows = [rows[0] for rows in self.race_rows.values()]
+            races = frame.iloc[first_rows][race_columns(frame.columns)]
+        self.races = races.set_index('Race Name') if 'Race Name' in races.columns else races
+
+    def __len__(self):
+        return len(self.frame)
+
+    def _rows(self, index, key):
+        rows = index.get(key)
+        if rows is None:
+            return self.frame.iloc[:0]
+        return self.frame.iloc[rows]
+
+    def driver(self, driver_name):
+        "Rows of one driver, in dataset order."
+        return self._rows(self.driver_rows, driver_name)
+
+    def race(self, race_name):
+        "Rows of one race, in dataset order."
+        return self._rows(self.race_rows, race_name)
+
+    def weather(self, race_name):
+        "Race level columns (weather, date, ...) of one race."
+        return self.races.loc[race_name]
+
+    def _with(self, frame, races):
+        # a RaceDataset of frame and races, sharing this one's indexes
+        data = RaceDataset.__new__(RaceDataset)
+        data.frame = frame
+        data.driver_rows = self.driver_rows
+        data.race_rows = self.race_rows
+        data.races = races
+        return data
+
+    def view(self):
+        """A RaceDataset sharing this one's data and indexes. The frames are shallow
+        copies, so replacing a column (frame.assign, frame[column] = ...) never
+        changes this dataset; the data of a cached dataset is read-only, see open_dataset."""
+        return self._with(self.frame.copy(deep=False), self.races.copy(deep=False))
+
+    def with_races(self, races):
+        """A RaceDataset whose race level columns (e.g. weather) are replaced by the
+        ones in races, a table with one row per race such as a normalized copy of
+        self.races. The values are gathered by race position, no join or scan."""
+        races = races.set_index('Race Name') if 'Race Name' in races.columns else races
+        frame = self.frame.copy(deep=False)
+        positions = races.index.get_indexer(frame['Race Name'])
+        for column in races.columns:
+            if column in frame.columns:
+                frame[column] = races[column].to_numpy()[positions]
+        return self._with(frame, races)
+
+
+# datasets already loaded in this process, by (absolute path, columns)
+_datasets = {}
+
+
+def _frozen(values):
+    values = np.array(values, copy=True)
+    values.flags.writeable = False
+    return values
+
+
+def _read_only(frame):
+    # the same frame with every column in its own non-writeable array, so a caller
+    # writing into the cached data (frame.loc[...] = ...) gets an error or a copy
+    columns = {}
+    for column in frame.columns:
+        array = frame[column].array
+        if isinstance(array, pd.Categorical):
+            columns[column] = pd.Categorical.from_codes(_frozen(array.codes), dtype=array.dtype)
+        elif isinstance(array, (pd.arrays.IntegerArray, pd.arrays.FloatingArray, pd.arrays.BooleanArray)):
+            values = array.to_numpy(dtype=array.dtype.numpy_dtype, na_value=0)
+            columns[column] = type(array)(_frozen(values), _frozen(pd.isna(array)))
+        else:
+            columns[column] = _frozen(frame[column].to_numpy())
+    return pd.DataFrame(columns, index=frame.index, copy=False)
+
+
+def source_files(path):
+    """Files a dataset is read from: the index of a partitioned dataset (rewritten
+    whenever a partition changes), the races/results tables if they exist, else
+    path itself."""
+
+    if is_partitioned(path):
+        return [os.path.join(path, PARTITION_INDEX)]
+    tables = [table_path(path, 'races'), table_path(path, 'results')]
+    if all(os.path.exists(table) for table in tables):
+        return tables
+    return [path]
+
+
+def open_dataset(path, columns=None, **filters):
+    """Returns the dataset at path as a RaceDataset sorted by race date, with only
+    the given columns (all by default).
+
+    The file is read, typed, sorted and indexed only once per process. Later
+    calls get a view of the cached copy, whose arrays are read-only, until the file's modification time or
+    size changes, which reloads it. filters (seasons, rounds, start, end,
+    drivers, teams, see prune_partitions) only work on partitioned datasets,
+    where they decide which partitions are read."""
+
+    path = os.path.abspath(path)
+    if columns is not None:
+        # needed to sort and index the dataset
+        columns = list(dict.fromkeys(['Race Name', 'Race Date', 'Driver Name'] + list(columns)))
+    files = source_files(path)
+    if filters and not is_partitioned(path):
+        raise ValueError("{} is not a partitioned dataset, it cannot be filtered".format(path))
+    key = tuple((file, os.stat(file).st_mtime_ns, os.stat(file).st_size) for file in files)
+    name = (path, None if columns is None else tuple(columns),
+            tuple(sorted((f, tuple(v) if isinstance(v, (list, set, tuple)) else v) for f, v in filters.items())))
+
+    cached = _datasets.get(name)
+    if cached is None or cached[0] != key:
+        if filters:
+            frame = read_partitioned(path, columns, **filters)
+        elif len(files) == 2:
+            frame = join_results(*read_tables(path, columns), columns=columns)
+        else:
+            frame = read_dataset(path, columns)
+        frame = frame.sort_values(by='Race Date', kind='stable').reset_index(drop=True)
+        data = RaceDataset(_read_only(frame))
+        data.races = _read_only(data.races)
+        cached = (key, data)
+        _datasets[name] = cached
+    return cached[1].view()
+
+
+def clear_cache():
+    "Forgets every dataset loaded by open_dataset."
+    _datasets.clear()
@@ -0,0 +1,81 @@
+# One command line for the whole project
+#
+# Every subcommand imports its module only when it runs, so `--help` starts
+# without loading pandas, matplotlib or fastf1, and e.g. `collect` never
+# imports matplotlib.
+#
+# How to run:
+#    python3 f1.py collect --filename f1_2023Weather.csv --workers 4   (same options as datamining.py)
+#    python3 f1.py normalize --input f1_2023Weather.csv                 (same options as normalizer.py)
+#    python3 f1.py plot weather                                         (shows one visualization)
+#    python3 f1.py plot rainy-vs-dry --output-dir renders --format svg  (saves it instead of showing it)
+#    python3 f1.py report --output-dir renders --workers 4              (same options as render.py)
+#    python3 f1.py sensitivity --target Position --workers 4           (same options as analysis.py)
+#    python3 f1.py aggregate --input f1.parquet --by points --workers 4 (same options as chunked.py)
+#    python3 f1.py cache --clear                                        (same options as memo.py)
+
+import argparse
+import importlib
+import os
+
+# plot name -> visualization function drawing it
+PLOTS = {
+    'weather': 'visualization12',
+    'drivers': 'visualization3',
+    'top5': 'visualization3Complete',
+    'rainy-vs-dry': 'visualization4',
+}
+
+# subcommands that hand their options to the main() of a module
+FORWARDED = {
+    'collect': ('datamining', 'collect race results and weather from fastf1 (datamining.py)'),
+    'normalize': ('normalizer', 'write the normalized dataset (normalizer.py)'),
+    'report': ('render', 'render every figure to files (render.py)'),
+    'sensitivity': ('analysis', 'rank the weather sensitivity of every driver (analysis.py)'),
+    'aggregate': ('chunked', 'aggregate a dataset larger than memory chunk by chunk (chunked.py)'),
+    'cache': ('memo', 'show or clear the cache of analysis results (memo.py)'),
+}
+
+
+def plot(name, module_name='Visualizations1', output_dir=None, fmt='png'):
+    "Draws one visualization, on screen or saved to output_dir/<module> when given."
+
+    if output_dir is not None:
+        import matplotlib
+        matplotlib.use('Agg')
+        import figures
+        figures.set_output(os.path.join(output_dir, module_name), fmt)
+    module = importlib.import_module(module_name)
+    getattr(module, PLOTS[name])()
+
+
+def main(argv=None):
+    aparser = argparse.ArgumentParser(
+        description='F1 race results and weather: collect the data, normalize it and plot it')
+    commands = aparser.add_subparsers(dest='command', required=True, metavar='command')
+
+    # these parse their own options, e.g. `f1.py collect --help` shows datamining.py's options
+    for command, (module_name, help) in FORWARDED.items():
+        commands.add_parser(command, help=help, add_help=False)
+
+    plot_parser = commands.add_parser('plot', help='draw one visualization')
+    plot_parser.add_argument('name', choices=list(PLOTS), help='visualization to draw')
+    plot_parser.add_argument('--module', default='Visualizations1', choices=['Visualizations1', 'Visualizations'],
+                             help='visualization module to use')
+    plot_parser.add_argument('--output-dir', default=None,
+                             help='save the figures to this directory instead of showing them')
+    plot_parser.add_argument('--format', default='png', choices=['png', 'svg', 'pdf'],
+                             help='file format with --output-dir')
+
+    args, rest = aparser.parse_known_args(argv)
+    if args.command in FORWARDED:
+        module = importlib.import_module(FORWARDED[args.command][0])
+        module.main(rest, prog="{} {}".format(aparser.prog, args.command))
+        return
+    if rest:
+        aparser.error('unrecognized arguments: {}'.format(' '.join(rest)))
+    plot(args.name, args.module, args.output_dir, args.format)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,33 @@
+# Where the finished figures of the visualization modules go
+#
+# By default every figure is shown on screen. render.py switches to headless
+# mode, where each figure is saved to a file instead and closed right away.
+
+import os
+
+# (directory, format) while rendering to files, None to show figures on screen
+_output = None
+
+
+def set_output(directory, fmt='png'):
+    "Saves every finished figure to directory as <name>.<fmt> instead of showing it."
+
+    global _output
+    os.makedirs(directory, exist_ok=True)
+    _output = (directory, fmt)
+
+
+def finish(name):
+    """Shows the current figure, or in headless mode saves it as <name>.<fmt> and closes it
+    so memory stays flat no matter how many figures are rendered."""
+
+    import matplotlib.pyplot as plt
+
+    if _output is None:
+        plt.show()
+        return
+    directory, fmt = _output
+    figure = plt.gcf()
+    filename = "".join(c if c.isalnum() or c in '-_' else '_' for c in name)
+    figure.savefig(os.path.join(directory, "{}.{}".format(filename, fmt)), format=fmt, bbox_inches='tight')
+    plt.close(figure)
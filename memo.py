@@ -0,0 +1,231 @@
+# Disk-backed memoization of analysis results
+#
+# @memoize caches the result of a function whose `path` argument is a dataset
+# file (or a partitioned dataset directory) in a directory of pickle files. The
+# key combines a sha256 of the dataset's content with the function's name and
+# its other arguments, so a result is reused until the data itself changes,
+# whatever its modification time. The hash of a file is remembered with its
+# modification time and size, so unchanged files are only hashed once.
+#
+# The cache holds at most MAX_BYTES; when a new result does not fit, the least
+# recently used results are removed first (every hit refreshes a file's time).
+# hits, misses and evictions are counted for every process.
+#
+# F1_CACHE_DIR moves the cache (default .f1_cache next to this file) and
+# F1_CACHE_MAX_MB changes its size cap, 0 turns the cache off.
+#
+# How to run:
+#    python3 memo.py --stats    (size and number of cached results)
+#    python3 memo.py --clear    (remove every cached result)
+
+import argparse
+import functools
+import hashlib
+import inspect
+import json
+import os
+import pickle
+import threading
+
+CACHE_DIR = os.environ.get('F1_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.f1_cache'))
+MAX_BYTES = int(float(os.environ.get('F1_CACHE_MAX_MB', '256')) * (1 << 20))
+
+# part of every key, a new version invalidates every result written by an older one
+VERSION = 1
+
+HASHES_NAME = 'hashes.json'
+
+
+class ResultCache:
+    """Pickled results in a directory, by key, with a size cap and LRU eviction."""
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._hashes = None
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def get(self, key):
+        "Returns (True, result) for a cached key, (False, None) otherwise."
+        path = self._path(key)
+        try:
+            with open(path, mode='rb') as file:
+                result = pickle.load(file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self._count('misses')
+            return False, None
+        # the modification time is the last use, see _evict
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        self._count('hits')
+        return True, result
+
+    def put(self, key, result):
+        data = pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL)
+        if len(data) > self.max_bytes:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        self._evict(self.max_bytes - len(data))
+        # another process may write the same key, a rename never leaves half a file
+        path = self._path(key)
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary, mode='wb') as file:
+            file.write(data)
+        os.replace(temporary, path)
+
+    def _entries(self):
+        # (last use, size, path) of every cached result, oldest first
+        entries = []
+        if not os.path.isdir(self.directory):
+            return entries
+        for name in os.listdir(self.directory):
+            if not name.endswith('.pickle'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime_ns, stat.st_size, path))
+        return sorted(entries)
+
+    def _evict(self, budget):
+        # remove the least recently used results until the others fit in budget bytes
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= budget:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            self._count('evictions')
+
+    def _count(self, counter):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self):
+        entries = self._entries()
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'results': len(entries), 'bytes': sum(size for _, size, _ in entries)}
+
+    def clear(self):
+        for _, _, path in self._entries():
+            os.remove(path)
+
+    def fingerprint(self, path):
+        """sha256 of the content of a dataset: its file, its races and results
+        tables, or every file of a partitioned dataset."""
+
+        import dataset
+
+        files = dataset.source_files(path)
+        if dataset.is_partitioned(path):
+            files += [os.path.join(path, p['file']) for p in dataset.read_partition_index(path)['partitions']]
+        digest = hashlib.sha256()
+        for file in files:
+            digest.update(os.path.basename(file).encode())
+            digest.update(self._file_hash(file).encode())
+        return digest.hexdigest()
+
+    def _file_hash(self, path):
+        # remembered by path, modification time and size, so an unchanged file is read once
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        stamp = [stat.st_mtime_ns, stat.st_size]
+        with self._lock:
+            if self._hashes is None:
+                self._hashes = self._load_hashes()
+            known = self._hashes.get(path)
+        if known is not None and known[:2] == stamp:
+            return known[2]
+
+        digest = hashlib.sha256()
+        with open(path, mode='rb') as file:
+            for block in iter(lambda: file.read(1 << 20), b''):
+                digest.update(block)
+        with self._lock:
+            self._hashes[path] = stamp + [digest.hexdigest()]
+            self._save_hashes()
+        return digest.hexdigest()
+
+    def _load_hashes(self):
+        try:
+            with open(os.path.join(self.directory, HASHES_NAME)) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def _save_hashes(self):
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, HASHES_NAME)
+        temporary = "{}.{}.tmp".format(path, os.getpid())
+        with open(temporary, mode='w') as file:
+            json.dump(self._hashes, file)
+        os.replace(temporary, path)
+
+
+# the cache @memoize uses
+cache = ResultCache()
+
+
+def memoize(function):
+    """Caches the results of function on disk, see ResultCache.
+
+    function must take the dataset as an argument named path, and its other
+    arguments must have a stable repr (numbers, strings, lists, ...)."""
+
+    signature = inspect.signature(function)
+    # by file rather than module name, which is __main__ when the file is run
+    name = "{}:{}".format(os.path.basename(function.__code__.co_filename), function.__qualname__)
+
+    @functools.wraps(function)
+    def cached(*args, **kwargs):
+        if cache.max_bytes <= 0:
+            return function(*args, **kwargs)
+        import pandas as pd
+
+        arguments = signature.bind(*args, **kwargs)
+        arguments.apply_defaults()
+        params = dict(arguments.arguments)
+        path = params.pop('path')
+        key = hashlib.sha256(repr((VERSION, pd.__version__, name, cache.fingerprint(path),
+                                   sorted(params.items()))).encode()).hexdigest()
+        found, result = cache.get(key)
+        if found:
+            return result
+        result = function(*args, **kwargs)
+        cache.put(key, result)
+        return result
+
+    return cached
+
+
+def main(argv=None, prog=None):
+    aparser = argparse.ArgumentParser(prog=prog, description='Show or clear the cache of analysis results')
+    aparser.add_argument('--clear', action='store_true', help='remove every cached result')
+    aparser.add_argument('--stats', action='store_true', help='print the size of the cache')
+    args = aparser.parse_args(argv)
+
+    if args.clear:
+        cache.clear()
+        print("Cleared {}".format(cache.directory))
+    stats = cache.stats()
+    if args.stats or not args.clear:
+        print("{} results, {:.1f} MB of {:.0f} MB in {}".format(
+            stats['results'], stats['bytes'] / (1 << 20), cache.max_bytes / (1 << 20), cache.directory))
+
+
+if __name__ == '__main__':
+    main()
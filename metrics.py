@@ -0,0 +1,85 @@
+# Run metrics of the collector (datamining.py --metrics-out)
+#
+# Metrics adds up the wall time of every stage of a run (schedule fetch, event
+# lookup, session load, weather aggregation, row building, writing, ...) and
+# of every stage of every event, next to row counts, bytes written and the
+# peak memory of the process, and writes them all to one JSON file. Stages can
+# be timed from several threads at once (sessions load on a thread pool).
+
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def peak_memory_mb():
+    "Peak resident memory of this process in MB, None where the platform cannot tell."
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1 << 20) if sys.platform == 'darwin' else peak / 1024
+
+
+class Metrics:
+    """Stage and event timings, counters and run settings of one collector run."""
+
+    def __init__(self, **settings):
+        self.settings = settings
+        self.stages = {}
+        self.events = {}
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._start = time.perf_counter()
+
+    @contextmanager
+    def stage(self, name, event=None):
+        """Times the block as stage name, and as a stage of event (an event name) when given."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, event)
+
+    def add_time(self, name, seconds, event=None):
+        with self._lock:
+            total = self.stages.setdefault(name, {'seconds': 0.0, 'calls': 0})
+            total['seconds'] += seconds
+            total['calls'] += 1
+            if event is not None:
+                stages = self._event(event).setdefault('stages', {})
+                stages[name] = stages.get(name, 0.0) + seconds
+
+    def _event(self, event):
+        return self.events.setdefault(event, {'event': event})
+
+    def record(self, event, **values):
+        "Sets values (rows, status, ...) of an event."
+        with self._lock:
+            self._event(event).update(values)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def summary(self):
+        return {
+            'started': time.strftime('%Y-%m-%dT%H:%M:%S', time.localtime(self._started)),
+            'seconds': time.perf_counter() - self._start,
+            'peak_memory_mb': peak_memory_mb(),
+            'settings': self.settings,
+            'counters': self.counters,
+            'stages': self.stages,
+            'events': list(self.events.values()),
+        }
+
+    def write(self, path):
+        "Writes the summary as JSON to path (through a temp file, like the checkpoint manifest)."
+        with open(path + '.tmp', mode='w') as file:
+            json.dump(self.summary(), file, indent=2, default=str)
+        os.replace(path + '.tmp', path)
@@ -0,0 +1,144 @@
+# Normalization of the numerical weather attributes
+#
+# WeatherNormalizer fits min-max or z-score parameters for all weather columns
+# in one pass, can save them to a json file and applies them to new rows
+# without refitting. normalize_file/append_file write the normalized dataset
+# (normalizedData.csv) once, or only add the rows that are new since last time.
+#
+# How to run:
+#    python3 normalizer.py --input f1_2023Weather.csv --output normalizedData.csv --params normalizer.json
+#    python3 normalizer.py --input f1_2023Weather.csv --output normalizedData.csv --params normalizer.json --append
+#      (after datamining.py --append: only the new rows are normalized, with the saved parameters)
+
+import argparse
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+WEATHER_COLUMNS = ['Air Temperature', 'Relative Humidity', 'Air Pressure', 'Track Temperature', 'Wind Speed']
+
+
+class WeatherNormalizer:
+    """Scales the weather columns with parameters fitted once.
+
+    minmax: (x - min) / (max - min), zscore: (x - mean) / std. A column that
+    never changes is scaled by 1, so it becomes all zeros."""
+
+    METHODS = ('minmax', 'zscore')
+
+    def __init__(self, method='minmax', columns=WEATHER_COLUMNS):
+        if method not in self.METHODS:
+            raise ValueError("method must be one of {}".format(", ".join(self.METHODS)))
+        self.method = method
+        self.columns = list(columns)
+        self.offset = None
+        self.scale = None
+
+    def fit(self, df):
+        "Fits the parameters of every column in a single vectorized pass."
+        values = df[self.columns].to_numpy(dtype=float)
+        if self.method == 'minmax':
+            self.offset = np.nanmin(values, axis=0)
+            self.scale = np.nanmax(values, axis=0) - self.offset
+        else:
+            self.offset = np.nanmean(values, axis=0)
+            self.scale = np.nanstd(values, axis=0)
+        self.scale = np.where(self.scale == 0, 1.0, self.scale)
+        return self
+
+    def transform(self, df):
+        "Returns a copy of df with the weather columns scaled, df itself is not changed."
+        if self.offset is None:
+            raise ValueError("WeatherNormalizer is not fitted yet")
+        values = (df[self.columns].to_numpy(dtype=float) - self.offset) / self.scale
+        return df.assign(**{column: values[:, i] for i, column in enumerate(self.columns)})
+
+    def fit_transform(self, df):
+        return self.fit(df).transform(df)
+
+    def save(self, path):
+        with open(path, mode='w') as file:
+            json.dump({
+                'method': self.method,
+                'columns': self.columns,
+                'offset': self.offset.tolist(),
+                'scale': self.scale.tolist(),
+            }, file, indent=2)
+
+    @classmethod
+    def load(cls, path):
+        with open(path) as file:
+            params = json.load(file)
+        normalizer = cls(params['method'], params['columns'])
+        normalizer.offset = np.array(params['offset'], dtype=float)
+        normalizer.scale = np.array(params['scale'], dtype=float)
+        return normalizer
+
+
+def _read_text(path, **kwargs):
+    # every column except the weather is copied as the exact text of the input file
+    return pd.read_csv(path, dtype=str, keep_default_na=False, **kwargs)
+
+
+def normalize_file(src, dest, normalizer, chunksize=100000):
+    """Writes the normalized copy of the dataset at src to dest, chunk by chunk.
+
+    The output is written once, to dest + '.part' which is renamed over dest at the end."""
+
+    with open(dest + '.part', mode='w', newline='') as file:
+        for i, chunk in enumerate(_read_text(src, chunksize=chunksize)):
+            normalizer.transform(chunk).to_csv(file, header=(i == 0), index=False, lineterminator='\r\n')
+    os.replace(dest + '.part', dest)
+
+
+def append_file(src, dest, normalizer, chunksize=100000):
+    """Normalizes only the rows of src that are not in dest yet and appends them to dest.
+
+    Returns the number of rows added."""
+
+    header = _read_text(dest, nrows=0).columns
+    with open(dest, newline='') as file:
+        done = sum(1 for line in file if line.strip()) - 1
+
+    # older outputs were written with the row number as a first, unnamed column
+    numbered = header[0].startswith('Unnamed')
+    added = 0
+    with open(dest, mode='a', newline='') as file:
+        for chunk in _read_text(src, skiprows=range(1, done + 1), chunksize=chunksize):
+            chunk = normalizer.transform(chunk)
+            if numbered:
+                chunk.insert(0, header[0], range(done + added, done + added + len(chunk)))
+            chunk.reindex(columns=header).to_csv(file, header=False, index=False, lineterminator='\r\n')
+            added += len(chunk)
+    return added
+
+
+# command line, also used by f1.py normalize
+def main(argv=None, prog=None):
+    aparser = argparse.ArgumentParser(
+        prog=prog,
+        description='Normalize the weather attributes of the F1 dataset')
+    aparser.add_argument('--input', default='f1_2023Weather.csv', help='dataset csv written by datamining.py')
+    aparser.add_argument('--output', default='normalizedData.csv', help='normalized csv to produce')
+    aparser.add_argument('--params', default='normalizer.json', help='json file with the fitted parameters')
+    aparser.add_argument('--method', default='minmax', choices=WeatherNormalizer.METHODS,
+                         help='scaling to fit (ignored with --append, the saved parameters are used)')
+    aparser.add_argument('--append', action='store_true',
+                         help='only normalize rows added to the input since the last run, without refitting')
+    args = aparser.parse_args(argv)
+
+    if args.append and os.path.exists(args.params) and os.path.exists(args.output):
+        normalizer = WeatherNormalizer.load(args.params)
+        print("Appended {} rows to {}".format(append_file(args.input, args.output, normalizer), args.output))
+    else:
+        # fitting only needs the weather columns
+        normalizer = WeatherNormalizer(args.method).fit(pd.read_csv(args.input, usecols=WEATHER_COLUMNS))
+        normalizer.save(args.params)
+        normalize_file(args.input, args.output, normalizer)
+        print("Wrote {} and {}".format(args.output, args.params))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+# Headless rendering of every figure of the visualization modules
+#
+# Each figure is one job for a process pool. The workers use matplotlib's
+# non-interactive Agg backend and save the figures to files instead of showing
+# them, closing every figure once it is saved so memory stays flat no matter
+# how many charts are rendered. Each worker reads the dataset once and reuses
+# it for all the jobs it gets. The top 5 drivers, weather and rain/dry tables
+# come from the result cache (memo.py) while the dataset does not change.
+#
+# How to run:
+#    python3 render.py --output-dir renders --format png --workers 4
+#    python3 render.py --output-dir renders --format svg --modules Visualizations1
+#      (figures of each module go to <output-dir>/<module>/<figure>.<format>)
+
+import argparse
+import importlib
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import memo
+
+FORMATS = ('png', 'svg', 'pdf')
+MODULES = ('Visualizations1', 'Visualizations')
+
+
+def _headless():
+    import matplotlib
+    matplotlib.use('Agg')
+
+
+# data of each module already prepared in this process, by module name
+_prepared = {}
+
+
+def _prepare(module):
+    "Loads what the figures of module need, once per process."
+
+    if module.__name__ not in _prepared:
+        f1_data, weatherData, top5_drivers, conditionList = module.weather_plot_data()
+        data = module.load_data()
+        _prepared[module.__name__] = {
+            'f1_data': f1_data,
+            'weatherData': weatherData,
+            'top5_drivers': top5_drivers,
+            'conditionList': conditionList,
+            'data': data,
+            'data_top5': module.load_top5_drivers(),
+            'rainy_vs_dry': module.load_rainy_vs_dry(),
+        }
+    return _prepared[module.__name__]
+
+
+def figure_jobs(module_name):
+    "Lists the (module, figure, argument) jobs that render every figure of a visualization module."
+
+    module = importlib.import_module(module_name)
+    prepared = _prepare(module)
+    jobs = [(module_name, 'top5_positions', None)]
+    jobs += [(module_name, 'weather_condition', i) for i in range(len(prepared['conditionList']))]
+    jobs.append((module_name, 'all_weather', None))
+    jobs += [(module_name, 'driver', str(driver)) for driver in prepared['data_top5']]
+    jobs.append((module_name, 'top5_over_time', None))
+    jobs.append((module_name, 'rainy_vs_dry', None))
+    return jobs
+
+
+def render_job(job, output_dir, fmt):
+    "Renders one figure to <output_dir>/<module>/ and returns the job."
+
+    _headless()
+    import figures
+
+    module_name, figure, argument = job
+    module = importlib.import_module(module_name)
+    prepared = _prepare(module)
+    figures.set_output(os.path.join(output_dir, module_name), fmt)
+
+    if figure == 'top5_positions':
+        module.plot_top5_positions(prepared['f1_data'], prepared['top5_drivers'])
+    elif figure == 'weather_condition':
+        module.plotWeatherCondition(prepared['top5_drivers'], prepared['conditionList'][argument],
+                                    module.CONDITION_NAMES[argument], prepared['weatherData'])
+    elif figure == 'all_weather':
+        module.plot_all_weather_conditions(prepared['top5_drivers'], prepared['conditionList'],
+                                           prepared['weatherData'])
+    elif figure == 'driver':
+        module.plot_driver_performance(prepared['data'], argument)
+    elif figure == 'top5_over_time':
+        module.plot_top5_performance(prepared['data'], prepared['data_top5'])
+    elif figure == 'rainy_vs_dry':
+        module.plot_rainy_vs_dry(prepared['data'], prepared['data_top5'], prepared['rainy_vs_dry'])
+    else:
+        raise ValueError("unknown figure {}".format(figure))
+    return job
+
+
+def _counted_render_job(job, output_dir, fmt):
+    # renders in a worker process and returns its result cache hits and misses,
+    # which the parent adds to its own counters
+    hits, misses = memo.cache.hits, memo.cache.misses
+    render_job(job, output_dir, fmt)
+    return memo.cache.hits - hits, memo.cache.misses - misses
+
+
+def render(output_dir, fmt='png', workers=1, modules=MODULES):
+    "Renders every figure of the given modules and returns how many were written."
+
+    _headless()
+    jobs = []
+    for module_name in modules:
+        jobs += figure_jobs(module_name)
+
+    if workers <= 1:
+        for job in jobs:
+            render_job(job, output_dir, fmt)
+        return len(jobs)
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_headless) as executor:
+        futures = [executor.submit(_counted_render_job, job, output_dir, fmt) for job in jobs]
+        for future in futures:
+            # raises here if the figure failed to render
+            hits, misses = future.result()
+            memo.cache.hits += hits
+            memo.cache.misses += misses
+    return len(jobs)
+
+
+# command line, also used by f1.py report
+def main(argv=None, prog=None):
+    aparser = argparse.ArgumentParser(
+        prog=prog,
+        description='Render every figure of the visualizations to files, without opening any window')
+    aparser.add_argument('--output-dir', default='renders', help='directory the figures are written to')
+    aparser.add_argument('--format', default='png', choices=FORMATS, help='file format of the figures')
+    aparser.add_argument('--workers', default=os.cpu_count() or 1, type=int,
+                         help='number of processes rendering figures at the same time')
+    aparser.add_argument('--modules', default=list(MODULES), nargs='+', choices=MODULES,
+                         help='visualization modules to render')
+    args = aparser.parse_args(argv)
+
+    start = time.perf_counter()
+    count = render(args.output_dir, args.format, args.workers, args.modules)
+    print("Rendered {} figures to {} in {:.1f}s".format(count, args.output_dir, time.perf_counter() - start))
+    stats = memo.cache.stats()
+    print("Result cache: {} hits, {} misses".format(stats['hits'], stats['misses']))
+
+
+if __name__ == '__main__':
+    main()
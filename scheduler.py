@@ -0,0 +1,115 @@
+# Retries, backoff, rate limiting and timeouts for session loads
+#
+# LoadScheduler wraps a session loader (datamining._load_session or a fake one,
+# see benchmark_loading.py) and is used in its place by load_sessions:
+#   - a failed load is tried again up to `retries` times, waiting backoff,
+#     2 * backoff, 4 * backoff, ... seconds (at most max_backoff) in between
+#   - all worker threads share one RateLimiter, so no more than `rate` loads
+#     start per second however many workers there are
+#   - a load that takes longer than `timeout` seconds counts as failed. Python
+#     cannot stop a running thread, so the timed out load is left to finish in
+#     the background and its result is dropped.
+# Every attempt is remembered, so the run can end with a failure report.
+
+import threading
+import time
+
+
+class RateLimiter:
+    """Lets at most `rate` calls per second through wait(), across all threads.
+    Without a rate it never waits."""
+
+    def __init__(self, rate=None, clock=time.monotonic, sleep=time.sleep):
+        self.interval = 1.0 / rate if rate else 0.0
+        self._clock = clock
+        self._sleep = sleep
+        self._next = None
+        self._lock = threading.Lock()
+
+    def wait(self):
+        if not self.interval:
+            return
+        # every caller reserves the next free slot, then sleeps until it comes
+        with self._lock:
+            now = self._clock()
+            start = now if self._next is None else max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            self._sleep(start - now)
+
+
+class LoadScheduler:
+    """Calls loader(race_event) with retries, exponential backoff, a shared rate
+    limit and a timeout per attempt. Raises the last error once every attempt
+    failed. attempts and failures record what happened to every event."""
+
+    def __init__(self, loader, retries=0, backoff=1.0, max_backoff=60.0, rate=None, timeout=None,
+                 sleep=time.sleep, metrics=None):
+        self.loader = loader
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.timeout = timeout
+        self.limiter = RateLimiter(rate, sleep=sleep)
+        self.metrics = metrics
+        self._sleep = sleep
+        # event name -> number of attempts, and (event name, attempts, error) of the events that never loaded
+        self.attempts = {}
+        self.failures = []
+        self._lock = threading.Lock()
+
+    def __call__(self, race_event):
+        name = race_event['OfficialEventName']
+        for attempt in range(1, self.retries + 2):
+            self.limiter.wait()
+            try:
+                result = self._attempt(race_event)
+            except Exception as err:
+                error = err
+                self._count('load timeouts' if isinstance(err, TimeoutError) else 'load errors')
+                if attempt > self.retries:
+                    break
+                self._count('load retries')
+                self._sleep(min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+            else:
+                self._record(name, attempt)
+                return result
+        self._record(name, attempt, error)
+        raise error
+
+    def _attempt(self, race_event):
+        if self.timeout is None:
+            return self.loader(race_event)
+
+        outcome = {}
+
+        def load():
+            try:
+                outcome['result'] = self.loader(race_event)
+            except BaseException as err:
+                outcome['error'] = err
+
+        thread = threading.Thread(target=load, daemon=True)
+        thread.start()
+        thread.join(self.timeout)
+        if thread.is_alive():
+            raise TimeoutError("load took longer than {}s".format(self.timeout))
+        if 'error' in outcome:
+            raise outcome['error']
+        return outcome['result']
+
+    def _record(self, name, attempts, error=None):
+        with self._lock:
+            self.attempts[name] = attempts
+            if error is not None:
+                self.failures.append((name, attempts, error))
+        if self.metrics is not None:
+            self.metrics.record(name, attempts=attempts)
+
+    def _count(self, counter):
+        if self.metrics is not None:
+            self.metrics.count(counter)
+
+    def retried(self):
+        "Names of the events that needed more than one attempt."
+        return [name for name, attempts in self.attempts.items() if attempts > 1]
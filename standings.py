@@ -0,0 +1,113 @@
+# Championship standings round by round
+#
+# Standings keeps the cumulative points of every driver after every round as
+# one matrix (rounds x drivers). New race rows are added on top of the last
+# row of totals, so earlier rounds are never aggregated again, and the top K
+# after any round comes from a partial selection (np.partition) of that
+# round's row instead of sorting every driver.
+
+import numpy as np
+import pandas as pd
+
+
+class Standings:
+    """Cumulative championship points after each round.
+
+    rounds are the race names in the order they were added, drivers the
+    driver names in the order they first scored (or raced), and points[r, d]
+    the total points of drivers[d] after rounds[r]."""
+
+    def __init__(self):
+        self.rounds = []
+        self.drivers = []
+        self._columns = {}
+        self.points = np.zeros((0, 0))
+
+    @classmethod
+    def from_frame(cls, df):
+        "Standings of every race in df, built in one vectorized pass."
+        return cls().update(df)
+
+    def __len__(self):
+        return len(self.rounds)
+
+    def update(self, df):
+        """Adds the races in df to the standings and returns self.
+
+        df holds 'Race Name', 'Driver Name' and 'Race Point' rows of races that
+        are not in the standings yet, in race order (e.g. sorted by Race Date).
+        Only these rows are aggregated, the totals so far are carried over."""
+
+        if not len(df):
+            return self
+        race_codes, races = pd.factorize(df['Race Name'], sort=False)
+        races = [str(race) for race in races]
+        repeated = set(races).intersection(self.rounds)
+        if repeated:
+            raise ValueError("races already in the standings: {}".format(", ".join(sorted(repeated))))
+
+        driver_codes, drivers = pd.factorize(df['Driver Name'], sort=False)
+        for driver in drivers:
+            driver = str(driver)
+            if driver not in self._columns:
+                self._columns[driver] = len(self.drivers)
+                self.drivers.append(driver)
+        # rows without a race or driver name (code -1) are left out, like groupby does
+        known = (race_codes >= 0) & (driver_codes >= 0)
+        columns = np.array([self._columns[str(driver)] for driver in drivers], dtype=int)[driver_codes[known]]
+
+        # points of every driver in every new round, then the running total on top of the last round
+        width = len(self.drivers)
+        points = np.nan_to_num(df['Race Point'].to_numpy(dtype=float))[known]
+        per_round = np.bincount(race_codes[known] * width + columns, weights=points,
+                                minlength=len(races) * width).reshape(len(races), width)
+        previous = np.zeros((1, width))
+        if len(self.rounds):
+            previous[0, :self.points.shape[1]] = self.points[-1]
+        totals = previous + np.cumsum(per_round, axis=0)
+
+        # drivers new in these rounds had 0 points before
+        earlier = np.zeros((len(self.rounds), width))
+        earlier[:, :self.points.shape[1]] = self.points
+        self.points = np.vstack([earlier, totals])
+        self.rounds += races
+        return self
+
+    def _round(self, after):
+        # row of the standings for a round number (1 is the first round) or a race name, default the last round
+        if after is None:
+            return len(self.rounds) - 1
+        if isinstance(after, str):
+            return self.rounds.index(after)
+        if not 1 <= after <= len(self.rounds):
+            raise IndexError("round {} is not in the standings (1 to {})".format(after, len(self.rounds)))
+        return after - 1
+
+    def totals(self, after=None):
+        "Points of every driver after a round (a round number or race name, default the last round)."
+        return pd.Series(self.points[self._round(after)], index=self.drivers, name='Race Point')
+
+    def top(self, k=5, after=None):
+        """Names of the k drivers with the most points after a round (a round
+        number or race name, default the last round), leader first."""
+
+        row = self.points[self._round(after)] if len(self.rounds) else np.zeros(0)
+        k = min(k, len(row))
+        if k <= 0:
+            return pd.Series([], dtype=object, name='Driver Name')
+        # every driver with at least the k-th most points, so a tie at the cut is
+        # decided by who appeared first rather than by where argpartition put them
+        kth = np.partition(-row, k - 1)[k - 1]
+        best = np.flatnonzero(-row <= kth)
+        best = best[np.lexsort((best, -row[best]))][:k]
+        return pd.Series([self.drivers[column] for column in best], name='Driver Name')
+
+    def over_time(self):
+        "The whole standings as a frame: one row per round (race name), one column per driver."
+        return pd.DataFrame(self.points, index=pd.Index(self.rounds, name='Race Name'),
+                            columns=pd.Index(self.drivers, name='Driver Name'))
+
+
+def top_drivers(df, k=5):
+    "Names of the k drivers with the most points over all the races in df, leader first."
+    return Standings.from_frame(df).top(k)